@@ -1,20 +1,30 @@
 from ARCANE.actions.action import Action
 from channels.communication_channel import CommunicationChannel
 import asyncio
-import subprocess
-from typing import List, Tuple, Optional
+import bisect
+import json
+from typing import List, Tuple, Optional, Union
 import os
+import mmap
 import aiohttp
 import base64
-from anthropic import Anthropic
+from llm.client_pool import get_anthropic_client
 from util import get_environment_variable
+from ARCANE.utils.command_runner import get_command_runner
+from ARCANE.utils.python_pool import get_python_pool
+from ARCANE.utils.run_cache import get_run_cache
 import shutil
 
+# view_file_contents returns at most this much unless max_bytes asks for more
+DEFAULT_VIEW_MAX_BYTES = 32 * 1024
+LINE_SCAN_CHUNK_SIZE = 1024 * 1024
+
 
 class QueryFileSystem(Action):
-    def __init__(self, command: str, work_directory: str):
+    def __init__(self, command: str, work_directory: str, agent_id: str = ""):
         self.command = command
         self.work_directory = work_directory
+        self.agent_id = agent_id
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
         print(f"Executing {self} in directory {self.work_directory}")
@@ -22,28 +32,25 @@ class QueryFileSystem(Action):
             # Ensure the workspace exists
             os.makedirs(self.work_directory, exist_ok=True)
 
-            # Construct the full command, constraining it to the work directory
-            full_command = f"cd {self.work_directory} && {self.command}"
-
-            # Execute the command
-            result = subprocess.run(
-                full_command, shell=True, check=True, capture_output=True, text=True
+            # The command runs in its own process group, constrained to the work directory
+            result = await get_command_runner(self.agent_id, self.work_directory).run(
+                self.command, cwd=self.work_directory
             )
+            if result.timed_out:
+                return (
+                    False,
+                    f"Error: Command '{self.command}' timed out after {result.duration:.0f}s and was killed. Partial output:\n{result.stdout}\n{result.stderr}",
+                )
+            if result.returncode != 0:
+                return (
+                    False,
+                    f"Error executing command '{self.command}' (exit code {result.returncode}): {result.stdout}\n{result.stderr}\nThis might be due to an invalid command or insufficient permissions.",
+                )
             output = result.stdout if result.stdout else "no output returned"
             return (
                 True,
                 f"Command '{self.command}' executed successfully. Output:\n{output}",
             )
-        except subprocess.CalledProcessError as e:
-            return (
-                False,
-                f"Error executing command '{self.command}': {e.output}\nThis might be due to an invalid command or insufficient permissions.",
-            )
-        except FileNotFoundError:
-            return (
-                False,
-                f"Error: The command '{self.command.split()[0]}' was not found. Please check if the command exists and is correctly spelled.",
-            )
         except PermissionError:
             return (
                 False,
@@ -60,16 +67,62 @@ class QueryFileSystem(Action):
 
 
 class ViewFileContents(Action):
-    def __init__(self, file_path: str, work_directory: str):
+    """
+    Shows a file, or a line or byte range of it, capped at max_bytes. Files are
+    memory-mapped, so only the requested range is ever materialised.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        work_directory: str,
+        start_line=None,
+        end_line=None,
+        start_byte=None,
+        end_byte=None,
+        max_bytes=None,
+    ):
         self.file_path = file_path
         self.work_directory = work_directory
+        self.start_line = start_line
+        self.end_line = end_line
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.max_bytes = max_bytes
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
         full_path = os.path.join(self.work_directory, self.file_path)
         try:
-            with open(full_path, "r") as file:
-                content = file.read()
-            return True, content
+            start_line, end_line, start_byte, end_byte, max_bytes = (
+                self.parse_range_param(value, name)
+                for name, value in (
+                    ("start_line", self.start_line),
+                    ("end_line", self.end_line),
+                    ("start_byte", self.start_byte),
+                    ("end_byte", self.end_byte),
+                    ("max_bytes", self.max_bytes),
+                )
+            )
+        except ValueError as e:
+            return False, f"Error: {str(e)}"
+        if (start_line or end_line) and (start_byte is not None or end_byte is not None):
+            return (
+                False,
+                "Error: Use either a line range (start_line, end_line) or a byte range (start_byte, end_byte), not both.",
+            )
+        if max_bytes is None:
+            max_bytes = int(os.getenv("VIEW_FILE_MAX_BYTES", DEFAULT_VIEW_MAX_BYTES))
+
+        try:
+            return True, await asyncio.to_thread(
+                self.read_range,
+                full_path,
+                start_line,
+                end_line,
+                start_byte,
+                end_byte,
+                max_bytes,
+            )
         except FileNotFoundError:
             return (
                 False,
@@ -91,18 +144,122 @@ class ViewFileContents(Action):
                 f"Error reading file '{self.file_path}': {str(e)}. This might be due to an I/O error or the file being in use by another process.",
             )
 
+    @staticmethod
+    def parse_range_param(value, name: str) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a whole number, got '{value}'.")
+        if number < (1 if name.endswith("_line") or name == "max_bytes" else 0):
+            raise ValueError(f"{name} is out of range: {number}.")
+        return number
+
+    def read_range(
+        self,
+        full_path: str,
+        start_line: Optional[int],
+        end_line: Optional[int],
+        start_byte: Optional[int],
+        end_byte: Optional[int],
+        max_bytes: int,
+    ) -> str:
+        with open(full_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return f"[{self.file_path}: 0 lines, 0 bytes]\n"
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                total_lines = count_lines(mm)
+                if start_byte is not None or end_byte is not None:
+                    start = min(start_byte or 0, size)
+                    end = size if end_byte is None else min(max(end_byte, start), size)
+                    data = mm[start : min(end, start + max_bytes)]
+                    shown = f"bytes {start}-{start + len(data)}"
+                    more = start + len(data) < end
+                    hint = f"start_byte={start + len(data)}"
+                else:
+                    first = start_line or 1
+                    last = min(end_line or total_lines, total_lines)
+                    start = line_offset(mm, first)
+                    end = line_offset(mm, last + 1)
+                    data = mm[start : min(end, start + max_bytes)]
+                    more = start + len(data) < end
+                    if more and b"\n" in data:
+                        # Cut at a line boundary so the next page starts on a whole line
+                        data = data[: data.rindex(b"\n") + 1]
+                    lines_shown = data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+                    shown_last = first + lines_shown - 1
+                    shown = f"lines {first}-{shown_last}" if data else "no lines"
+                    if data.endswith(b"\n"):
+                        hint = f"start_line={shown_last + 1}"
+                    else:
+                        # A single line longer than max_bytes continues by byte offset
+                        hint = f"start_byte={start + len(data)}"
+
+        header = f"[{self.file_path}: {total_lines} lines, {size} bytes; showing {shown}]"
+        content = data.decode("utf-8", errors="replace")
+        if more:
+            content += f"\n... [truncated at {max_bytes} bytes; continue with {hint}]"
+        return f"{header}\n{content}"
+
+
+def count_lines(mm: mmap.mmap) -> int:
+    newlines = 0
+    for offset in range(0, len(mm), LINE_SCAN_CHUNK_SIZE):
+        newlines += mm[offset : offset + LINE_SCAN_CHUNK_SIZE].count(b"\n")
+    return newlines + (0 if mm[-1:] == b"\n" else 1)
+
+
+def line_offset(mm: mmap.mmap, line_number: int) -> int:
+    """Byte offset where a 1-based line starts, or the file size past the last line."""
+    remaining = line_number - 1
+    offset = 0
+    while remaining > 0 and offset < len(mm):
+        chunk = mm[offset : offset + LINE_SCAN_CHUNK_SIZE]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            offset += len(chunk)
+            continue
+        position = -1
+        for _ in range(remaining):
+            position = chunk.index(b"\n", position + 1)
+        return offset + position + 1
+    return len(mm) if remaining > 0 else offset
+
 
 class EditFileContents(Action):
-    def __init__(self, file_path: str, content: str, work_directory: str):
+    """
+    Overwrites a file with content, or, given edits, patches it in place. Edits
+    are resolved against the file as it was before any of them, and either all
+    apply (written atomically) or none do and the conflicts are reported.
+
+    Edit forms:
+      {"type": "search_replace", "search": ..., "replace": ..., "replace_all": false}
+      {"type": "replace_lines", "start_line": N, "end_line": M, "content": ...}
+      {"type": "insert_after", "anchor": ..., "content": ...}
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        content: Optional[str],
+        work_directory: str,
+        edits: Optional[Union[str, List[dict]]] = None,
+    ):
         self.file_path = file_path
         self.content = content
         self.work_directory = work_directory
+        self.edits = edits
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
+        if self.edits is not None:
+            return await asyncio.to_thread(self.apply_edits)
         full_path = os.path.join(self.work_directory, self.file_path)
         try:
             with open(full_path, "w") as file:
-                file.write(self.content)
+                file.write(self.content or "")
             return True, f"File edited successfully: {full_path}"
         except FileNotFoundError:
             return (
@@ -125,6 +282,175 @@ class EditFileContents(Action):
                 f"Error editing file '{self.file_path}': {str(e)}. This might be due to an I/O error, lack of disk space, or the file being in use by another process.",
             )
 
+    def apply_edits(self) -> Tuple[bool, str]:
+        full_path = os.path.join(self.work_directory, self.file_path)
+        edits = self.edits
+        if isinstance(edits, str):
+            try:
+                edits = json.loads(edits)
+            except ValueError as e:
+                return False, f"Error: edits is not valid JSON: {str(e)}"
+        if isinstance(edits, dict):
+            edits = [edits]
+        if not isinstance(edits, list) or not all(isinstance(e, dict) for e in edits):
+            return False, "Error: edits must be a list of edit objects."
+        if not edits:
+            return (
+                False,
+                "Error: edits is empty. Provide at least one edit, or omit edits to overwrite the file with content.",
+            )
+
+        try:
+            with open(full_path, "r", newline="") as file:
+                original = file.read()
+        except FileNotFoundError:
+            return (
+                False,
+                f"Error: File not found. The file '{self.file_path}' does not exist in the work directory; use create_new_file to create it.",
+            )
+        except (PermissionError, IsADirectoryError, UnicodeDecodeError) as e:
+            return False, f"Error: Unable to read '{self.file_path}' for editing: {str(e)}"
+
+        line_starts = self.line_starts(original)
+        total_lines = len(line_starts) - 1
+
+        spans, conflicts = [], []
+        for number, edit in enumerate(edits, start=1):
+            try:
+                resolved = self.resolve_edit(edit, original, line_starts)
+            except (KeyError, TypeError, ValueError) as e:
+                conflicts.append(f"edit {number} ({edit.get('type')}): {str(e)}")
+                continue
+            spans.extend((start, end, text, number) for start, end, text in resolved)
+
+        # Insertions sort ahead of a replacement that starts at the same offset
+        spans.sort(key=lambda span: (span[0], span[1], span[3]))
+        for previous, current in zip(spans, spans[1:]):
+            if current[0] < previous[1]:
+                conflicts.append(
+                    f"edit {current[3]} overlaps edit {previous[3]} (line {self.line_of(current[0], line_starts)})"
+                )
+        if conflicts:
+            return (
+                False,
+                f"Error: No edits applied to '{self.file_path}' because of conflicts:\n- "
+                + "\n- ".join(conflicts),
+            )
+
+        parts, position = [], 0
+        for start, end, text, _ in spans:
+            parts.append(original[position:start])
+            parts.append(text)
+            position = end
+        parts.append(original[position:])
+        updated = "".join(parts)
+
+        temp_path = f"{full_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", newline="") as file:
+                file.write(updated)
+            shutil.copymode(full_path, temp_path)
+            os.replace(temp_path, full_path)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False, f"Error writing edits to '{self.file_path}': {str(e)}"
+
+        new_lines = len(self.line_starts(updated)) - 1
+        return (
+            True,
+            f"File edited successfully: {full_path} ({len(edits)} edit(s) applied, {total_lines} -> {new_lines} lines)",
+        )
+
+    def resolve_edit(
+        self, edit: dict, original: str, line_starts: List[int]
+    ) -> List[Tuple[int, int, str]]:
+        """Turns one edit into (start, end, replacement) spans over the original text."""
+        edit_type = edit.get("type")
+        if edit_type == "search_replace":
+            search = edit["search"]
+            if not search:
+                raise ValueError("search text is empty")
+            matches = self.find_all(original, search)
+            if not matches:
+                raise ValueError("search text not found")
+            if len(matches) > 1 and not edit.get("replace_all"):
+                lines = ", ".join(str(self.line_of(m, line_starts)) for m in matches[:10])
+                raise ValueError(
+                    f"search text matches {len(matches)} times (lines {lines}); "
+                    "include more surrounding text or set replace_all"
+                )
+            replace = edit.get("replace", "")
+            return [(m, m + len(search), replace) for m in matches]
+
+        if edit_type == "replace_lines":
+            total_lines = len(line_starts) - 1
+            start_line = int(edit["start_line"])
+            end_line = int(edit.get("end_line", start_line))
+            if not 1 <= start_line <= end_line <= total_lines:
+                raise ValueError(
+                    f"line range {start_line}-{end_line} is outside the file's {total_lines} lines"
+                )
+            start, end = line_starts[start_line - 1], line_starts[end_line]
+            return [(start, end, self.as_lines(edit.get("content", ""), original[start:end]))]
+
+        if edit_type == "insert_after":
+            anchor = edit["anchor"]
+            if not anchor:
+                raise ValueError("anchor text is empty")
+            matches = self.find_all(original, anchor)
+            if len(matches) != 1:
+                raise ValueError(
+                    "anchor text not found"
+                    if not matches
+                    else f"anchor text matches {len(matches)} times; make it unique"
+                )
+            # Insert after the end of the line the anchor ends on
+            line = self.line_of(matches[0] + len(anchor) - 1, line_starts)
+            position = line_starts[line]
+            content = edit.get("content", "")
+            if position == len(original) and original and not original.endswith("\n"):
+                content = "\n" + content
+            return [(position, position, self.as_lines(content, original[position - 1 : position]))]
+
+        raise ValueError(
+            f"unknown edit type '{edit_type}' (expected search_replace, replace_lines or insert_after)"
+        )
+
+    @staticmethod
+    def find_all(text: str, needle: str) -> List[int]:
+        matches, position = [], text.find(needle)
+        while position != -1:
+            matches.append(position)
+            position = text.find(needle, position + len(needle))
+        return matches
+
+    @staticmethod
+    def line_starts(text: str) -> List[int]:
+        """
+        Offsets where each line starts, plus len(text) as the end. Only \n ends a
+        line, matching the numbering view_file_contents shows.
+        """
+        starts, position = [0], text.find("\n")
+        while position != -1:
+            starts.append(position + 1)
+            position = text.find("\n", position + 1)
+        if starts[-1] != len(text):
+            starts.append(len(text))
+        return starts
+
+    @staticmethod
+    def line_of(offset: int, line_starts: List[int]) -> int:
+        """1-based line containing a character offset."""
+        return max(bisect.bisect_right(line_starts, offset) - 1, 0) + 1
+
+    @staticmethod
+    def as_lines(content: str, replaced: str) -> str:
+        # Whole-line edits keep the file's line structure unless the text they replace lacked a newline
+        if content and not content.endswith("\n") and replaced.endswith("\n"):
+            return content + "\n"
+        return content
+
 
 class CreateNewFile(Action):
     def __init__(self, file_path: str, work_directory: str, content: str = ""):
@@ -181,24 +507,41 @@ class RunPythonFile(Action):
                     f"Error: The file '{self.file_path}' does not exist in the work directory. Please check the file path and try again.",
                 )
 
-            command = f"python {full_path}"
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=self.work_directory,
-            )
-            stdout, stderr = await process.communicate()
+            script_path = os.path.abspath(full_path)
+            work_directory = os.path.abspath(self.work_directory)
+            run_cache = get_run_cache()
+            result = None
+            if run_cache is not None:
+                result = await run_cache.lookup(script_path, work_directory)
+            if result is not None:
+                return (
+                    True,
+                    f"File executed successfully: {full_path}\n"
+                    "Cache hit: true (the script and the files it reads are unchanged since its last run, "
+                    "so that run's output is returned; add '# aiversity: nondeterministic' to the script to always re-run it)\n"
+                    f"Output:\n{result.stdout}"
+                    + (f"\nWarnings or non-fatal errors:\n{result.stderr}" if result.stderr else ""),
+                )
+
+            # Forked from a warm interpreter with common modules preloaded
+            result = await get_python_pool().run(script_path, work_directory)
+            if run_cache is not None:
+                await run_cache.store(script_path, work_directory, result)
 
-            if process.returncode == 0:
-                output = f"File executed successfully: {full_path}\nOutput:\n{stdout.decode()}"
-                if stderr:
-                    output += f"\nWarnings or non-fatal errors:\n{stderr.decode()}"
+            if result.timed_out:
+                return (
+                    False,
+                    f"Error executing file '{self.file_path}': timed out and was killed.\nOutput:\n{result.stdout}\nError output:\n{result.stderr}",
+                )
+            if result.returncode == 0:
+                output = f"File executed successfully: {full_path}\nOutput:\n{result.stdout}"
+                if result.stderr:
+                    output += f"\nWarnings or non-fatal errors:\n{result.stderr}"
                 return True, output
             else:
                 return (
                     False,
-                    f"Error executing file '{self.file_path}':\nExit code: {process.returncode}\nError output:\n{stderr.decode()}",
+                    f"Error executing file '{self.file_path}':\nExit code: {result.returncode}\nError output:\n{result.stderr}",
                 )
 
         except PermissionError:
@@ -240,12 +583,13 @@ class UpdateWhiteboard(Action):
 
 
 class SendNIACLMessage(Action):
-    def __init__(self, receiver: str, message: str, sender: str, agent_config: dict, files: List[str] = None):
+    def __init__(self, receiver: str, message: str, sender: str, agent_config: dict, files: List[str] = None, thread_id: Optional[str] = None):
         self.receiver = receiver
         self.message = message
         self.sender = sender
         self.agent_config = agent_config
         self.files = files or []
+        self.thread_id = thread_id
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
         try:
@@ -263,6 +607,8 @@ class SendNIACLMessage(Action):
                 "sender": self.sender.lower(),
                 "copied_files": copied_files
             }
+            if self.thread_id:
+                payload["thread_id"] = self.thread_id
 
             async with aiohttp.ClientSession() as session:
                 async with session.post(url, json=payload) as response:
@@ -302,7 +648,7 @@ class VisualizeImage(Action):
     def __init__(self, file_path: str, work_directory: str):
         self.file_path = file_path
         self.work_directory = work_directory
-        self.client = Anthropic(api_key=get_environment_variable("ANT_API_KEY"))
+        self.client = get_anthropic_client(get_environment_variable("ANT_API_KEY"))
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
         full_path = os.path.join(self.work_directory, self.file_path)
@@ -322,7 +668,7 @@ class VisualizeImage(Action):
             media_type = self.get_media_type(file_extension)
 
             # Create a message request to the Anthropic API
-            message = self.client.messages.create(
+            message = await self.client.messages.create(
                 model="claude-3-opus-20240229",
                 max_tokens=1000,
                 messages=[
@@ -1,4 +1,9 @@
-from util import load_actions
+import threading
+from util import load_actions, load_action_definitions
+
+# agent type -> (action definitions mtime, (all_actions, action_descriptions, action_example))
+_action_sections = {}
+_action_sections_lock = threading.Lock()
 
 base_prompt = """
 I am an AI agent in the AIversity adaptive learning system. My role is to assist in providing personalized educational experiences.
@@ -50,6 +55,28 @@ def generate_agent_prompt(agent_config):
     else:
         agent_type = agent_name
 
+    all_actions, action_descriptions, action_example = get_action_sections(agent_type)
+
+    return base_prompt.format(
+        specific_context=agent_config["specific_context"],
+        personality=agent_config["personality"],
+        all_actions=all_actions,
+        action_descriptions=action_descriptions,
+        action_example=action_example,
+    )
+
+
+def get_action_sections(agent_type):
+    """
+    Returns (all_actions, action_descriptions, action_example) for an agent type,
+    rebuilt only when action_definitions.yaml changes.
+    """
+    mtime, _ = load_action_definitions()
+    with _action_sections_lock:
+        cached = _action_sections.get(agent_type)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
     actions = load_actions(agent_type)
 
     all_actions = ", ".join([action["name"] for action in actions])
@@ -61,15 +88,10 @@ def generate_agent_prompt(agent_config):
         ]
     )
 
-    action_example = generate_action_example(agent_type)
-
-    return base_prompt.format(
-        specific_context=agent_config["specific_context"],
-        personality=agent_config["personality"],
-        all_actions=all_actions,
-        action_descriptions=action_descriptions,
-        action_example=action_example,
-    )
+    sections = (all_actions, action_descriptions, generate_action_example(agent_type))
+    with _action_sections_lock:
+        _action_sections[agent_type] = (mtime, sections)
+    return sections
 
 
 def generate_action_example(agent_type):
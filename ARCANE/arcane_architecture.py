@@ -3,13 +3,20 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import uuid
 import logging
-import importlib
 import json
 from util import get_environment_variable
-from llm.LLM import LLM
+from llm.LLM import (
+    LLM,
+    PromptSegment,
+    render_segments,
+    stable_segment,
+    volatile_segment,
+)
 from channels.communication_channel import CommunicationChannel
 import ARCANE.agent_prompting.agent_prompts as prompts
 from ARCANE.actions.action import Action
+from ARCANE.memory.narrative_compactor import NarrativeCompactor
+from ARCANE.utils.workspace_context import DEFAULT_EXTENSIONS, get_workspace_context
 from ARCANE.actions.triage_agent_actions import (
     SendMessageToStratos,
     SendMessageToStudent,
@@ -57,45 +64,195 @@ class Event:
 
 
 class GlobalEventLog:
+    """
+    Append-only event log. Events are kept in arrival order and each one is
+    rendered to its narrative line once, when it is added, so building the
+    narrative only costs the events added since the last build.
+
+    Older events can be folded into rolling summaries (see NarrativeCompactor):
+    the narrative is then the meta summary, the summaries, and the events after
+    compacted_events verbatim.
+    """
+
     def __init__(self):
         self.events: List[Event] = []
+        self._lines: List[Optional[str]] = []
+        self._narrative = ""
+        self._narrated_events = 0
+        self.compacted_events = 0
+        self.summaries: List[str] = []
+        self.meta_summary: Optional[str] = None
+        self._summary_text = ""
+        self._verbatim_chars = 0
 
     def add_event(self, event: Event, agent_id: str):
-        self.events.append(event)
+        self.append(event)
         print(f"{agent_id} -> Added event: {event.type} - {event.data}")
 
+    def append(self, event: Event, line: Optional[str] = None):
+        line = line if line is not None else self.render_event(event)
+        self.events.append(event)
+        self._lines.append(line)
+        if line is not None:
+            self._verbatim_chars += len(line)
+
     def get_recent_events(self, n: int) -> List[Event]:
-        return sorted(self.events, key=lambda e: e.timestamp, reverse=True)[:n]
+        if n <= 0:
+            return []
+        return self.events[-n:][::-1]
+
+    @staticmethod
+    def render_event(event: Event) -> Optional[str]:
+        if event.type == "user_message":
+            return f"[{event.timestamp}] User: {event.data['content']}"
+        elif event.type == "agent_message":
+            sender = event.data.get("sender", "Unknown Agent")
+            return f"[{event.timestamp}] Agent {sender}: {event.data['content']}"
+        elif event.type == "agent_action":
+            action_data = json.dumps(event.data, indent=2)
+            return f"[{event.timestamp}] Agent action (completed successfully):\n{action_data}"
+        elif event.type == "goal_set":
+            return f"[{event.timestamp}] Goal set: {event.data['goal']}"
+        elif event.type == "task_execution":
+            return f"[{event.timestamp}] Task Execution:\n{event.data['content']}. Results may still need to be communicated with agents that requested this task."
+        elif event.type == "file_added":
+            return f"[{event.timestamp}] User added file to workspace: {event.data['file_name']}"
+        elif event.type == "file_deleted":
+            return f"[{event.timestamp}] File deleted from workspace: {event.data['file_name']}"
+        return None
 
     def to_narrative(self) -> str:
-        narrative = []
-        for event in sorted(self.events, key=lambda e: e.timestamp):
-            if event.type == "user_message":
-                narrative.append(f"[{event.timestamp}] User: {event.data['content']}")
-            elif event.type == "agent_message":
-                sender = event.data.get("sender", "Unknown Agent")
-                narrative.append(
-                    f"[{event.timestamp}] Agent {sender}: {event.data['content']}"
-                )
-            elif event.type == "agent_action":
-                action_data = json.dumps(event.data, indent=2)
-                narrative.append(f"[{event.timestamp}] Agent action (completed successfully):\n{action_data}")
-            elif event.type == "goal_set":
-                narrative.append(f"[{event.timestamp}] Goal set: {event.data['goal']}")
-            elif event.type == "task_execution":
-                narrative.append(
-                    f"[{event.timestamp}] Task Execution:\n{event.data['content']}. Results may still need to be communicated with agents that requested this task."
-                )
-            elif event.type == "file_added":
-                narrative.append(
-                    f"[{event.timestamp}] User added file to workspace: {event.data['file_name']}"
-                )
-            elif event.type == "file_deleted":
-                narrative.append(
-                    f"[{event.timestamp}] File deleted from workspace: {event.data['file_name']}"
+        narrative = self._verbatim_narrative()
+        if self._summary_text:
+            return f"{self._summary_text}\n[Recent events]\n{narrative}"
+        return narrative
+
+    def _verbatim_narrative(self) -> str:
+        if self._narrated_events < len(self._lines):
+            new_lines = [
+                line for line in self._lines[self._narrated_events :] if line is not None
+            ]
+            if new_lines:
+                addition = "\n".join(new_lines)
+                self._narrative = (
+                    f"{self._narrative}\n{addition}" if self._narrative else addition
                 )
+            self._narrated_events = len(self._lines)
+        return self._narrative
+
+    def tail(self, n: int) -> str:
+        """Narrative of the last n narrated events."""
+        lines = []
+        for line in reversed(self._lines):
+            if len(lines) >= n:
+                break
+            if line is not None:
+                lines.append(line)
+        return "\n".join(reversed(lines))
 
-        return "\n".join(narrative)
+    def window(self, start: int, end: Optional[int] = None) -> str:
+        """Narrative of events[start:end], in arrival order."""
+        return "\n".join(line for line in self._lines[start:end] if line is not None)
+
+    def get_compaction_candidate(
+        self, max_chars: int
+    ) -> Optional[Tuple[int, str]]:
+        """
+        If the verbatim narrative exceeds max_chars, returns (end, text) where
+        events[compacted_events:end] are the oldest verbatim events to fold so
+        that about half of the budget remains verbatim.
+        """
+        if self._verbatim_chars <= max_chars:
+            return None
+        remaining = self._verbatim_chars
+        end = self.compacted_events
+        folded = []
+        while end < len(self._lines) and remaining > max_chars // 2:
+            line = self._lines[end]
+            if line is not None:
+                folded.append(line)
+                remaining -= len(line)
+            end += 1
+        if not folded:
+            return None
+        return end, "\n".join(folded)
+
+    def fold(self, end: int, summary: str):
+        """Replaces events[compacted_events:end] in the narrative with a summary."""
+        folded_chars = sum(
+            len(line)
+            for line in self._lines[self.compacted_events : end]
+            if line is not None
+        )
+        self.summaries.append(summary)
+        self.compacted_events = end
+        self._verbatim_chars -= folded_chars
+        self._narrated_events = max(self._narrated_events, end)
+        self._narrative = self.window(end, self._narrated_events)
+        self._refresh_summary_text()
+
+    def fold_summaries(self, count: int, meta_summary: str):
+        """Replaces the meta summary and the oldest count summaries with a new meta summary."""
+        self.meta_summary = meta_summary
+        self.summaries = self.summaries[count:]
+        self._refresh_summary_text()
+
+    def _refresh_summary_text(self):
+        parts = ["[Summary of earlier events]"]
+        if self.meta_summary:
+            parts.append(self.meta_summary)
+        parts.extend(self.summaries)
+        self._summary_text = "\n".join(parts)
+
+
+# Thread id used for agent messages that arrive without one
+DEFAULT_THREAD_ID = "default"
+
+
+def conversation_key(sender_id: str, thread_id: Optional[str] = None) -> str:
+    """
+    Users are keyed by their user_id; agent messages by sender plus thread id,
+    so each NIACL exchange gets its own shard. Replies on a known thread are
+    routed to its originating shard by ArcaneArchitecture.resolve_conversation.
+    """
+    if thread_id is None:
+        return sender_id
+    return f"{sender_id}#{thread_id}"
+
+
+class PartitionedEventLog:
+    """
+    Event logs sharded by conversation key. Workspace events (file_added and
+    the like) go to the shared slice and are also appended to every shard, so a
+    conversation's narrative covers its own history plus the agent-level events
+    without paying for other conversations.
+    """
+
+    def __init__(self):
+        self.shared = GlobalEventLog()
+        self.conversations: Dict[str, GlobalEventLog] = {}
+
+    def get(self, conversation: Optional[str] = None) -> GlobalEventLog:
+        if conversation is None:
+            return self.shared
+        log = self.conversations.get(conversation)
+        if log is None:
+            log = GlobalEventLog()
+            for event, line in zip(self.shared.events, self.shared._lines):
+                log.append(event, line)
+            self.conversations[conversation] = log
+        return log
+
+    def add_event(
+        self, event: Event, agent_id: str, conversation: Optional[str] = None
+    ):
+        if conversation is not None:
+            self.get(conversation).add_event(event, agent_id)
+            return
+        self.shared.add_event(event, agent_id)
+        line = self.shared._lines[-1]
+        for log in self.conversations.values():
+            log.append(event, line)
 
 
 class ArcaneArchitecture:
@@ -108,29 +265,49 @@ class ArcaneArchitecture:
         agent_config: dict,
         arcane_system,
         agent_factory,
+        responsive_llm: Optional[LLM] = None,
     ):
         self.llm = llm
         self.logger = logger
         self.agent_id = agent_id
         self.agent_prompt = agent_prompt
-        self.global_event_log = GlobalEventLog()
+        self.event_logs = PartitionedEventLog()
+        self.narrative_compactor = (
+            NarrativeCompactor(responsive_llm, logger) if responsive_llm else None
+        )
+        # conversation key -> thread id to propagate on outgoing NIACL messages
+        self.conversation_threads: Dict[str, str] = {}
+        # thread id -> key of the conversation that started it, so replies on
+        # the thread land in that conversation's shard
+        self.thread_origins: Dict[str, str] = {}
         self.prompts = prompts
         self.agent_config = agent_config
         self.arcane_system = arcane_system
         self.agent_factory = agent_factory
-        importlib.reload(prompts)
         self.is_core_agent = agent_id in ["iris-5000", "stratos-5001"]
 
-    async def send_niacl_message(self, receiver: str, message: str) -> Tuple[bool, str]:
-        action = SendNIACLMessage(receiver, message, self.agent_id, self.agent_config)
+    def rebind(self, agent_id: str, agent_prompt: str, agent_config: dict):
+        """Reuses this architecture for another agent, dropping all conversation state."""
+        self.agent_id = agent_id
+        self.agent_prompt = agent_prompt
+        self.agent_config = agent_config
+        self.is_core_agent = agent_id in ["iris-5000", "stratos-5001"]
+        self.clear_event_log()
+
+    async def send_niacl_message(
+        self, receiver: str, message: str, thread_id: Optional[str] = None
+    ) -> Tuple[bool, str]:
+        action = SendNIACLMessage(
+            receiver, message, self.agent_id, self.agent_config, thread_id=thread_id
+        )
         return await action.execute()
 
-    async def generate_initial_goal(self) -> str:
+    async def generate_initial_goal(self, conversation: Optional[str] = None) -> str:
         # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
-        narrative = self.global_event_log.to_narrative()
-        last_message = self.get_last_message_from_log()
+        narrative = self.event_logs.get(conversation).to_narrative()
+        last_message = self.get_last_message_from_log(conversation)
 
-        goal_prompt = self.create_goal_prompt(narrative)
+        goal_prompt = await self.create_goal_prompt(narrative)
         tool_config = self.llm.get_tool_config("set_goal", self.agent_config["name"])
         goal_response = await self.llm.create_chat_completion(
             goal_prompt, last_message, tool_config
@@ -145,17 +322,14 @@ class ArcaneArchitecture:
         self.logger.warning("Failed to generate a valid goal. Using default.")
         return "Process the message and respond appropriately"
 
-    def get_last_message_from_log(self) -> str:
-        for event in reversed(self.global_event_log.events):
+    def get_last_message_from_log(self, conversation: Optional[str] = None) -> str:
+        for event in reversed(self.event_logs.get(conversation).events):
             if event.type in ["user_message", "agent_message"]:
                 return event.data.get("content", "")
         return ""
 
-    def create_goal_prompt(self, narrative: str) -> str:
-        context = self.create_system_message()
-        return f"""
-        {context}
-
+    async def create_goal_prompt(self, narrative: str) -> List[PromptSegment]:
+        instructions = """
         SYSTEM: You are a specialized goal-setting module within the AIversity system. Your sole purpose is to analyze the provided narrative and determine an appropriate goal based on the user's request or the current situation.
 
         IMPORTANT INSTRUCTIONS:
@@ -164,19 +338,25 @@ class ArcaneArchitecture:
         3. The goal should be concise but descriptive, capturing the main objective based on the narrative.
         4. The goal should be actionable and clear for other parts of the system to work with.
 
-        NARRATIVE OF EVENTS:
-        {narrative}
-
         TASK:
         Carefully analyze the narrative and determine an appropriate goal that addresses the user's request or the current situation.
 
         RESPONSE FORMAT:
         Use ONLY the set_goal tool to define the goal. Do not include any other text or explanations in your response.
         """
+        return await self.compose_prompt(
+            instructions,
+            f"""
+        NARRATIVE OF EVENTS:
+        {narrative}
+        """,
+        )
 
-    async def goal_achieved(self, goal: str, actions: List[Dict]) -> bool:
-        narrative = self.global_event_log.to_narrative()
-        goal_check_prompt = self.create_goal_check_prompt(goal, narrative)
+    async def goal_achieved(
+        self, goal: str, actions: List[Dict], conversation: Optional[str] = None
+    ) -> bool:
+        narrative = self.event_logs.get(conversation).to_narrative()
+        goal_check_prompt = await self.create_goal_check_prompt(goal, narrative)
         tool_config = self.llm.get_tool_config("goal_check", self.agent_id)
         # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
         user_message = f"""
@@ -210,42 +390,61 @@ class ArcaneArchitecture:
 
         return False
 
+    def resolve_conversation(
+        self, sender_id: str, thread_id: Optional[str] = None
+    ) -> str:
+        """
+        Shard key for a message. Replies on a thread go to the conversation that
+        started it, e.g. an agent answering on thread "user_x" joins user_x's shard.
+        """
+        if thread_id in self.thread_origins:
+            return self.thread_origins[thread_id]
+        return conversation_key(sender_id, thread_id)
+
     async def process_message(
-        self, sender_id: str, message: str, communication_channel: CommunicationChannel
+        self,
+        sender_id: str,
+        message: str,
+        communication_channel: CommunicationChannel,
+        thread_id: Optional[str] = None,
     ) -> Tuple[str, List[Dict[str, Any]]]:
+        conversation = self.resolve_conversation(sender_id, thread_id)
+        thread = self.conversation_threads.setdefault(conversation, thread_id or sender_id)
+        # Messages without a thread share DEFAULT_THREAD_ID, which names no conversation
+        if thread != DEFAULT_THREAD_ID:
+            self.thread_origins.setdefault(thread, conversation)
+        event_log = self.event_logs.get(conversation)
+
         # Determine if the sender is a user or an agent
         event_type = (
             "user_message" if sender_id.startswith("user_") else "agent_message"
         )
         event_data = {"content": message, "sender": sender_id}
 
-        # Add the incoming message to the global event log
-        self.global_event_log.add_event(Event(event_type, event_data), self.agent_id)
+        # Add the incoming message to this conversation's event log
+        event_log.add_event(Event(event_type, event_data), self.agent_id)
 
         # Generate the initial goal
-        goal = await self.generate_initial_goal()
-        self.global_event_log.add_event(
-            Event("goal_set", {"goal": goal}), self.agent_id
-        )
+        goal = await self.generate_initial_goal(conversation)
+        event_log.add_event(Event("goal_set", {"goal": goal}), self.agent_id)
 
         executed_actions = []
         max_iterations = 5  # Limit the number of iterations to prevent infinite loops
 
         for _ in range(max_iterations):
-            if await self.goal_achieved(goal, executed_actions):
+            if await self.goal_achieved(goal, executed_actions, conversation):
                 break
 
-            narrative = self.global_event_log.to_narrative()
-            next_action = await self.determine_next_action(goal, executed_actions)
+            next_action = await self.determine_next_action(
+                goal, executed_actions, conversation
+            )
 
             if next_action:
-                self.global_event_log.add_event(
-                    Event("agent_action", next_action), self.agent_id
-                )
+                event_log.add_event(Event("agent_action", next_action), self.agent_id)
 
                 try:
                     success, result = await self.execute_action(
-                        next_action, communication_channel
+                        next_action, communication_channel, conversation
                     )
                     executed_actions.append(
                         {"action": next_action, "success": success, "result": result}
@@ -265,19 +464,21 @@ class ArcaneArchitecture:
                 )
                 break
 
-        return self.global_event_log.to_narrative(), executed_actions
+        if self.narrative_compactor:
+            self.narrative_compactor.schedule(event_log)
+        return event_log.to_narrative(), executed_actions
 
     async def determine_next_action(
-        self, goal: str, actions: List[Dict]
+        self, goal: str, actions: List[Dict], conversation: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
-        action_prompt = self.create_action_prompt(
-            goal, actions, self.global_event_log.to_narrative()
+        action_prompt = await self.create_action_prompt(
+            goal, actions, self.event_logs.get(conversation).to_narrative()
         )
         tool_config = self.llm.get_tool_config(
             "create_action", agent_type=self.agent_id.split("-")[0]
         )
         action_response = await self.llm.create_chat_completion(
-            action_prompt, self.get_last_message_from_log(), tool_config
+            action_prompt, self.get_last_message_from_log(conversation), tool_config
         )
 
         if action_response:
@@ -292,10 +493,13 @@ class ArcaneArchitecture:
         }
 
     async def execute_action(
-        self, action_data: Dict[str, Any], communication_channel: CommunicationChannel
+        self,
+        action_data: Dict[str, Any],
+        communication_channel: CommunicationChannel,
+        conversation: Optional[str] = None,
     ) -> Tuple[bool, Any]:
         try:
-            action = self.parse_action(communication_channel, action_data)
+            action = self.parse_action(communication_channel, action_data, conversation)
             if action is None:
                 self.logger.warning(f"Unknown action: {action_data}")
                 return False, "Unknown action"
@@ -313,8 +517,10 @@ class ArcaneArchitecture:
 
             if isinstance(action, DelegateAndExecuteTask) and success:
                 self.logger.debug("Adding task execution event to log")
-                self.global_event_log.add_event(
-                    Event("task_execution", {"content": result}), self.agent_id
+                self.event_logs.add_event(
+                    Event("task_execution", {"content": result}),
+                    self.agent_id,
+                    conversation,
                 )
 
             if action_data["action"] != "send_message_to_student" and communication_channel is not None:
@@ -340,7 +546,10 @@ class ArcaneArchitecture:
             self.logger.error(f"Error in asynchronous NIACL execution: {str(e)}", exc_info=True)
 
     def parse_action(
-        self, communication_channel: CommunicationChannel, action_data: dict
+        self,
+        communication_channel: CommunicationChannel,
+        action_data: dict,
+        conversation: Optional[str] = None,
     ) -> Optional[Action]:
         self.logger.debug(f"Parsing action: {action_data}")
 
@@ -357,15 +566,24 @@ class ArcaneArchitecture:
 
         action_map = {
             "run_command": lambda: QueryFileSystem(
-                command=params.get("command", ""), work_directory=working_directory
+                command=params.get("command", ""),
+                work_directory=working_directory,
+                agent_id=self.agent_id,
             ),
             "view_file_contents": lambda: ViewFileContents(
-                file_path=params.get("file_path", ""), work_directory=working_directory
+                file_path=params.get("file_path", ""),
+                work_directory=working_directory,
+                start_line=params.get("start_line"),
+                end_line=params.get("end_line"),
+                start_byte=params.get("start_byte"),
+                end_byte=params.get("end_byte"),
+                max_bytes=params.get("max_bytes"),
             ),
             "edit_file_contents": lambda: EditFileContents(
                 file_path=params.get("file_path", ""),
                 content=params.get("content", ""),
                 work_directory=working_directory,
+                edits=params.get("edits"),
             ),
             "create_new_file": lambda: CreateNewFile(
                 file_path=params.get("file_path", ""),
@@ -388,7 +606,8 @@ class ArcaneArchitecture:
                 message=params.get("message", ""),
                 sender=self.agent_id.lower(),
                 agent_config=self.agent_config,
-                files=params.get("files", [])
+                files=params.get("files", []),
+                thread_id=self.conversation_threads.get(conversation),
             ),
             "delegate_and_execute_task": lambda: DelegateAndExecuteTask(
                 plan_name=params.get("task_name", "Unnamed Task"),
@@ -399,6 +618,7 @@ class ArcaneArchitecture:
                 agent_factory=self.agent_factory,
                 stratos=self.arcane_system,
                 logger=self.logger,
+                thread_id=self.conversation_threads.get(conversation),
             ),
             "declare_complete": lambda: DeclareComplete(
                 agent_id=self.agent_id,
@@ -426,22 +646,21 @@ class ArcaneArchitecture:
             return None
 
     def get_last_message(self, sender_id: str) -> str:
-        for event in reversed(self.global_event_log.events):
-            if event.type in ["user_message", "agent_message"]:
-                return event.data.get("content", "")
-        return ""
+        return self.get_last_message_from_log(sender_id)
 
-    def create_action_prompt(
+    async def create_action_prompt(
         self, goal: str, actions: List[Dict], narrative: str
-    ) -> str:
-        context = self.create_system_message()
+    ) -> List[PromptSegment]:
         action_log_str = json.dumps(actions, indent=2)
-        return f"""
-        {context}
-
+        instructions = """
         I am an AI assistant tasked with determining the next action to take towards achieving a goal.
         Given the following context, goal, action history, and narrative of events, I will decide on the next action.
 
+        I will determine the next action to take to achieve the goal. I will remember to communicate any retrieved information or completed tasks to the user.
+        """
+        return await self.compose_prompt(
+            instructions,
+            f"""
         Goal:
         ========
         {goal}
@@ -456,15 +675,13 @@ class ArcaneArchitecture:
         ========
         {narrative}
         ========
+        """,
+        )
 
-        I will determine the next action to take to achieve the goal. I will remember to communicate any retrieved information or completed tasks to the user.
-        """
-
-    def create_goal_check_prompt(self, goal: str, narrative: str) -> str:
-        context = self.create_system_message()
-        return f"""
-        {context}
-
+    async def create_goal_check_prompt(
+        self, goal: str, narrative: str
+    ) -> List[PromptSegment]:
+        instructions = """
         SYSTEM: You are a specialized goal achievement verification module within the AIversity system. Your sole purpose is to analyze the provided narrative and determine if the specified goal has been achieved based ONLY on the actions and events described in the narrative. 
 
         IMPORTANT GUIDELINES:
@@ -475,12 +692,6 @@ class ArcaneArchitecture:
         5. Intentions, plans, or descriptions of future actions do NOT count as achievement. Only completed actions matter.
         6. If the narrative doesn't clearly indicate goal completion, the goal is NOT achieved.
 
-        GOAL TO VERIFY:
-        {goal}
-
-        NARRATIVE OF EVENTS:
-        {narrative}
-
         TASK:
         Carefully analyze the narrative and determine if the goal has been achieved based SOLELY on the actions and events described.
 
@@ -491,22 +702,55 @@ class ArcaneArchitecture:
 
         Do NOT include any other text, explanations, or action suggestions in your response.
         """
+        return await self.compose_prompt(
+            instructions,
+            f"""
+        GOAL TO VERIFY:
+        {goal}
+
+        NARRATIVE OF EVENTS:
+        {narrative}
+        """,
+        )
 
-    def create_system_message(self) -> str:
+    async def compose_prompt(
+        self, instructions: str, dynamic_context: str
+    ) -> List[PromptSegment]:
+        # Stable segments first, in a fixed order, so every call of the same kind
+        # shares a byte-identical cacheable prefix; per-call state goes last.
+        agent_segment, workspace_segment = await self.create_system_segments()
+        return [
+            agent_segment,
+            stable_segment(instructions),
+            workspace_segment,
+            volatile_segment(dynamic_context),
+        ]
+
+    async def create_system_segments(self) -> List[PromptSegment]:
         # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
-        directory_contents = self.get_directory_contents()
-        return f"""
+        directory_contents = await self.get_directory_contents()
+        return [
+            stable_segment(
+                f"""
         {self.agent_prompt}
         
         IMPORTANT: After any action that retrieves information or performs a task, you MUST include a send_message_to_student action (for user messages) or other appropriate action.
-
+        """
+            ),
+            volatile_segment(
+                f"""
         Current working directory structure and file contents:
         ============
         {directory_contents}
         ============
         """
+            ),
+        ]
+
+    async def create_system_message(self) -> str:
+        return render_segments(await self.create_system_segments())
 
-    def get_directory_contents(self):
+    async def get_directory_contents(self):
         work_directory = self.agent_config.get("work_directory")
         if not work_directory:
             # If work_directory is not set, use a default directory or return a message
@@ -515,28 +759,18 @@ class ArcaneArchitecture:
         # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
         if not os.path.exists(work_directory):
             return f"Work directory does not exist: {work_directory}"
-        structure = []
-        for root, dirs, files in os.walk(work_directory):
-            level = root.replace(work_directory, "").count(os.sep)
-            indent = " " * 4 * level
-            structure.append(f"{indent}{os.path.basename(root)}/")
-            subindent = " " * 4 * (level + 1)
-            for f in files:
-                if f.endswith((".py", ".yaml", ".txt", ".md", ".csv")):
-                    file_path = os.path.join(root, f)
-                    relative_path = os.path.relpath(file_path, work_directory)
-                    structure.append(f"{subindent}{relative_path}")
-                    with open(file_path, "r") as file:
-                        content = file.read()
-                    structure.append(f"{subindent}Content of {relative_path}:")
-                    structure.append(f"{subindent}{content}")
-        return "\n".join(structure)
-
-    def get_event_log(self) -> GlobalEventLog:
-        return self.global_event_log
+        extensions = tuple(
+            self.agent_config.get("workspace_extensions", DEFAULT_EXTENSIONS)
+        )
+        return await get_workspace_context(work_directory, extensions).render_async()
+
+    def get_event_log(self, conversation: Optional[str] = None) -> GlobalEventLog:
+        return self.event_logs.get(conversation)
 
     def clear_event_log(self):
-        self.arcane_architecture.global_event_log = GlobalEventLog()
+        self.event_logs = PartitionedEventLog()
+        self.conversation_threads = {}
+        self.thread_origins = {}
 
     # async def handle_error(self, error: Exception, sender_id: str, communication_channel: CommunicationChannel) -> None:
     #     error_message = f"An error occurred: {str(error)}"
@@ -1,12 +1,25 @@
 from datetime import datetime
 import json
 import logging
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 from ARCANE.agent_prompting.agent_prompts import generate_agent_prompt
 from ARCANE.actions.file_manipulation import SendNIACLMessage
 from channels.web.agent_communication_channel import AgentCommunicationChannel
 from llm.LLM import LLM
-from ARCANE.arcane_architecture import ArcaneArchitecture, Event, GlobalEventLog
+from llm.client_pool import get_llm, close_clients
+from llm.log_sink import close_log_sinks
+from ARCANE.arcane_architecture import (
+    ArcaneArchitecture,
+    Event,
+    GlobalEventLog,
+    DEFAULT_THREAD_ID,
+)
+from ARCANE.planning.worker_pool import close_task_worker_pool
+from ARCANE.utils.python_pool import close_python_pool
+from ARCANE.planning.stratos_planning import (
+    DelegateAndExecuteTask,
+    list_interrupted_plans,
+)
 from channels.communication_channel import CommunicationChannel
 import os
 import asyncio
@@ -37,6 +50,7 @@ class ArcaneSystem:
         self.common_actions = common_actions
         self.agent_prompt = generate_agent_prompt(agent_config)
         self.agent_factory = agent_factory
+        self.responsive_llm = get_llm(logger, api_key, os.getenv("CLAUDE_RESPONSIVE_MODEL"))
         self.arcane_architecture = ArcaneArchitecture(
             self.llm,
             self.logger,
@@ -45,6 +59,7 @@ class ArcaneSystem:
             self.agent_config,
             self,
             self.agent_factory,
+            responsive_llm=self.responsive_llm,
         )
         self.allowed_communications = agent_config["allowed_communications"]
         self.message_queue = deque(maxlen=100)  # Limit to last 100 messages
@@ -53,19 +68,18 @@ class ArcaneSystem:
         # if self.agent_id == "stratos-5001":
         #     self.status = "busy"
         self.current_action = None
-        self.responsive_llm = LLM(logger, api_key, os.getenv("CLAUDE_RESPONSIVE_MODEL"))
         self.personalization_service = PersonalizationService(self.responsive_llm, self.logger)
         
 
     async def log_file_addition(self, file_name: str):
         print(f"Logging file addition: {file_name}")
         event = Event("file_added", {"file_name": file_name})
-        self.arcane_architecture.global_event_log.add_event(event, self.agent_id)
+        self.arcane_architecture.event_logs.add_event(event, self.agent_id)
 
     async def log_file_deletion(self, file_name: str):
         print(f"Logging file deletion: {file_name}")  # Debug print
         event = Event("file_deleted", {"file_name": file_name})
-        self.arcane_architecture.global_event_log.add_event(event, self.agent_id)
+        self.arcane_architecture.event_logs.add_event(event, self.agent_id)
 
     async def set_status(self, status: str, action_description: str = None):
         self.status = status
@@ -133,18 +147,21 @@ class ArcaneSystem:
         try:
             message = data.get("message", "")
             copied_files = data.get("copied_files", [])
+            thread_id = data.get("thread_id") or DEFAULT_THREAD_ID
 
             communication_channel = AgentCommunicationChannel(sender, message, self)
 
             # If there are copied files, log them and personalize them if the receiver is iris-5000 and the files are .txt
             if copied_files:
-                await self.log_copied_files(sender, copied_files)
+                await self.log_copied_files(sender, copied_files, thread_id)
                 if self.agent_id == "iris-5000":
                     txt_files = [file for file in copied_files if file.endswith('.txt')]
                     if txt_files:
                         await self.personalize_copied_files(txt_files)
 
-            narrative, actions = await self.arcane_architecture.process_message(sender, message, communication_channel)
+            narrative, actions = await self.arcane_architecture.process_message(
+                sender, message, communication_channel, thread_id
+            )
 
             print(f"Processed agent message from {sender}. Actions taken: {len(actions)}")
 
@@ -167,8 +184,14 @@ class ArcaneSystem:
                 self.logger.warning(f"File not found for personalization: {file_name}")
 
 
-    async def log_copied_files(self, sender: str, copied_files: List[str]):
+    async def log_copied_files(
+        self, sender: str, copied_files: List[str], thread_id: Optional[str] = None
+    ):
         if copied_files:
+            # Recorded in the conversation the files were sent for
+            conversation = self.arcane_architecture.resolve_conversation(
+                sender, thread_id or DEFAULT_THREAD_ID
+            )
             timestamp = datetime.now().isoformat()
             file_transfer_event = Event(
                 "file_transfer",
@@ -178,20 +201,23 @@ class ArcaneSystem:
                     "timestamp": timestamp
                 }
             )
-            self.arcane_architecture.global_event_log.add_event(file_transfer_event, self.agent_id)
+            self.arcane_architecture.event_logs.add_event(
+                file_transfer_event, self.agent_id, conversation
+            )
             
             # Add a message to the agent's narrative
             file_list = ", ".join(copied_files)
             narrative_message = f"[{timestamp}] {sender} copied the following files to your directory: {file_list}"
-            self.arcane_architecture.global_event_log.add_event(
+            self.arcane_architecture.event_logs.add_event(
                 Event("agent_message", {"content": narrative_message, "sender": "System"}),
-                self.agent_id
+                self.agent_id,
+                conversation,
             )
 
     async def log_agent_message(self, sender: str, message: str):
         # Remove the event logging from here - was causing duplicate messages
         # event = Event("agent_message", {"sender": sender, "content": message})
-        # self.arcane_architecture.global_event_log.add_event(event)
+        # self.arcane_architecture.event_logs.add_event(event, self.agent_id)
 
         # Keep only the print statement
         print(f"Received message from {sender}: {message[:50]}...")
@@ -203,22 +229,73 @@ class ArcaneSystem:
             "agent_message_processed",
             {"narrative": narrative, "actions": actions, "sender_id": sender_id},
         )
-        self.arcane_architecture.global_event_log.add_event(event, self.agent_id)
+        self.arcane_architecture.event_logs.add_event(event, self.agent_id)
 
     async def start(self) -> None:
         self.logger.info(f"Starting {self.name} ArcaneSystem")
-        # Any additional initialization code can go here
+        if (
+            "delegate_and_execute_task" in self.get_available_actions()
+            and os.getenv("PLAN_RESUME_ON_STARTUP", "true").lower() == "true"
+        ):
+            asyncio.create_task(self.resume_delegated_plans())
+
+    async def resume_delegated_plans(self):
+        """Finishes plans a previous run of this agent was executing when it stopped."""
+        for plan in await list_interrupted_plans(self.agent_id):
+            requesting_agent = plan.requesting_agent or ""
+            thread_id = plan.thread_id or DEFAULT_THREAD_ID
+            action = DelegateAndExecuteTask(
+                plan.name,
+                plan.description,
+                requesting_agent,
+                self.agent_id,
+                self.llm,
+                self.agent_factory,
+                self,
+                self.logger,
+                plan.thread_id,
+            )
+            await self.set_status("busy", f"Resuming delegated task {plan.name}")
+            try:
+                success, result = await action.resume(plan.id)
+            finally:
+                await self.unset_busy_status()
+            if not success:
+                self.logger.error(result)
+                continue
+            if not requesting_agent:
+                continue
+
+            # The action that started the plan died with the old process, so hand the
+            # result back to the conversation it came from to finish the goal there
+            conversation = self.arcane_architecture.resolve_conversation(
+                requesting_agent, thread_id
+            )
+            self.arcane_architecture.event_logs.add_event(
+                Event("task_execution", {"content": result}), self.agent_id, conversation
+            )
+            message = f"[System] The delegated task '{plan.name}' was resumed after a restart and has finished."
+            await self.arcane_architecture.process_message(
+                requesting_agent,
+                message,
+                AgentCommunicationChannel(requesting_agent, message, self),
+                thread_id,
+            )
 
     async def shutdown(self) -> None:
         self.logger.info(f"Shutting down {self.name} ArcaneSystem")
         await self.arcane_architecture.shutdown()
+        await close_clients()
+        await asyncio.to_thread(close_task_worker_pool)
+        await close_python_pool()
+        await asyncio.to_thread(close_log_sinks)
         # Add any additional cleanup code here
 
-    def get_event_log(self) -> GlobalEventLog:
-        return self.arcane_architecture.global_event_log
+    def get_event_log(self, conversation: str = None) -> GlobalEventLog:
+        return self.arcane_architecture.get_event_log(conversation)
 
     def clear_event_log(self):
-        self.arcane_architecture.global_event_log = GlobalEventLog()
+        self.arcane_architecture.clear_event_log()
 
     async def handle_error(
         self,
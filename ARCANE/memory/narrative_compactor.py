@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+from llm.LLM import LLM
+
+# Rough characters-per-token ratio used to turn the token window into a budget
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_WINDOW = 6000
+DEFAULT_MAX_SUMMARIES = 4
+
+
+class NarrativeCompactor:
+    """
+    Keeps event-log narratives bounded by folding old events into summaries
+    written by the responsive model. Recent events stay verbatim, older ones
+    become rolling summaries, and once there are more than max_summaries of
+    those the oldest are folded again into a single meta summary.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        logger: logging.Logger,
+        token_window: Optional[int] = None,
+        max_summaries: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.logger = logger
+        self.token_window = token_window or int(
+            os.getenv("NARRATIVE_TOKEN_WINDOW", DEFAULT_TOKEN_WINDOW)
+        )
+        self.max_summaries = max_summaries or int(
+            os.getenv("NARRATIVE_MAX_SUMMARIES", DEFAULT_MAX_SUMMARIES)
+        )
+        self._running: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, event_log):
+        """Starts a background compaction of event_log if it is over budget."""
+        if id(event_log) in self._running:
+            return
+        if (
+            event_log.get_compaction_candidate(self.max_chars) is None
+            and len(event_log.summaries) <= self.max_summaries
+        ):
+            return
+
+        task = asyncio.create_task(self.compact(event_log))
+        self._running[id(event_log)] = task
+        task.add_done_callback(lambda _: self._running.pop(id(event_log), None))
+
+    @property
+    def max_chars(self) -> int:
+        return self.token_window * CHARS_PER_TOKEN
+
+    async def compact(self, event_log):
+        try:
+            candidate = event_log.get_compaction_candidate(self.max_chars)
+            if candidate is not None:
+                end, text = candidate
+                summary = await self.summarize(text, meta=False)
+                if summary:
+                    event_log.fold(end, summary)
+
+            if len(event_log.summaries) > self.max_summaries:
+                # Keep the newest summary as-is and fold everything older into the meta tier
+                count = len(event_log.summaries) - 1
+                previous = [event_log.meta_summary] if event_log.meta_summary else []
+                text = "\n\n".join(previous + event_log.summaries[:count])
+                meta_summary = await self.summarize(text, meta=True)
+                if meta_summary:
+                    event_log.fold_summaries(count, meta_summary)
+        except Exception as e:
+            self.logger.error(f"Error compacting narrative: {str(e)}", exc_info=True)
+
+    async def summarize(self, text: str, meta: bool) -> Optional[str]:
+        scope = (
+            "a set of earlier summaries of an agent's history"
+            if meta
+            else "the oldest part of an agent's event narrative"
+        )
+        prompt = f"""
+        You are a memory compaction module within the AIversity system. You are given {scope}.
+        Write a concise summary that preserves everything later decisions may depend on:
+        user requests and preferences, goals set, actions taken and their outcomes,
+        files created or exchanged, and any commitments still outstanding.
+        Write in the past tense, in plain prose, without preamble.
+
+        TEXT TO SUMMARIZE:
+        {text}
+        """
+        return await self.llm.create_chat_completion(
+            prompt, "Summarize the text above now."
+        )
@@ -1,22 +1,44 @@
 import asyncio
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from ARCANE.planning.plan_structures import Plan, Level, Task
+from ARCANE.planning.plan_structures import Plan, Level, Task, TaskResult
 from ARCANE.planning.plan_persistence import PlanPersistence
-from util import get_environment_variable
-from llm.LLM import LLM
+from ARCANE.planning.task_graph import derive_file_conflicts, task_dependencies
+from ARCANE.planning.task_cache import get_task_cache
+from ARCANE.planning.worker_pool import get_task_worker_pool, is_process_mode
+from ARCANE.planning.task_scheduler import (
+    BACKGROUND_PRIORITY,
+    get_task_agent_scheduler,
+)
+from llm.LLM import LLM, PromptSegment, stable_segment, volatile_segment
+from ARCANE.utils.command_runner import release_command_runner
+from ARCANE.utils.workspace_context import release_workspace_contexts
+from tracing import Trace, record_span, span, start_trace, tracing_enabled
 import logging
 import os
 import json
+import time
 
 MAX_AGENT_ACTIONS = 5
+# Characters of a task's final message kept in the result record handed downstream
+DEFAULT_RESULT_SUMMARY_CHARS = 600
+TASK_WORKSPACE_EXTENSIONS = (".py", ".yaml", ".txt", ".json", ".md", ".csv")
 
 
 class PlanExecutor:
     def __init__(
-        self, plan: Plan, agent_factory, stratos, llm: LLM, logger: logging.Logger
+        self,
+        plan: Plan,
+        agent_factory,
+        stratos,
+        llm: LLM,
+        logger: logging.Logger,
+        priority: int = BACKGROUND_PRIORITY,
     ):
         self.plan = plan
+        self.priority = priority
+        self.scheduler = get_task_agent_scheduler()
+        self.task_cache = get_task_cache()
         self.agent_factory = agent_factory
         self.stratos = stratos
         self.llm = llm
@@ -31,66 +53,305 @@ class PlanExecutor:
         )
         os.makedirs(self.plan_directory, exist_ok=True)
         self.collective_narrative = []
+        self.dependencies: Dict[str, set] = {}
+        self._checkpoint_lock = asyncio.Lock()
+
+    @classmethod
+    async def resume(
+        cls, plan_id: str, agent_factory, stratos, llm: LLM, logger: logging.Logger
+    ) -> "PlanExecutor":
+        """Reloads a checkpointed plan; execute_plan then only runs unfinished tasks."""
+        plan_persistence = PlanPersistence(
+            os.path.join("aiversity_workspaces", stratos.agent_id, "plans")
+        )
+        plan = await plan_persistence.load_plan(plan_id)
+        logger.info(f"Resuming plan {plan.name} ({plan.id})")
+        return cls(plan, agent_factory, stratos, llm, logger)
+
+    async def checkpoint(self):
+        await self.update_plan_status()
+        async with self._checkpoint_lock:
+            try:
+                await self.plan_persistence.save_plan(self.plan)
+            except OSError as e:
+                self.logger.error(f"Failed to checkpoint plan {self.plan.id}: {str(e)}")
 
     async def execute_plan(self) -> str:
-        collective_narrative = []
+        """
+        Runs the plan, recording plan/level/task/action/LLM spans that are
+        written as Chrome trace events to <plan id>.trace.json next to the plan
+        checkpoint, outside the directory task agents see.
+        """
+        if not tracing_enabled():
+            return await self.run_tasks()
+        with start_trace(f"Plan {self.plan.name}") as trace:
+            try:
+                with span("plan", "plan", plan_id=self.plan.id):
+                    return await self.run_tasks()
+            finally:
+                self.export_trace(trace)
+
+    def export_trace(self, trace: Trace):
         for level in self.plan.levels:
-            level_narrative = await self.execute_level(level)
-            formatted_level_narrative = self.format_level_narrative(
-                level, level_narrative
-            )
-            collective_narrative.append(formatted_level_narrative)
+            if level.start_time and level.end_time:
+                record_span(
+                    f"Level {level.order}",
+                    "level",
+                    level.start_time.timestamp(),
+                    level.end_time.timestamp(),
+                    lane_name="levels",
+                    status=level.status,
+                    tasks=len(level.tasks),
+                )
+        try:
+            trace.export(self.plan_persistence.trace_path(self.plan.id))
+        except OSError as e:
+            self.logger.error(f"Failed to export trace for plan {self.plan.id}: {str(e)}")
 
-            # Pass accumulated narrative to the next level
-            if level.order < len(self.plan.levels) - 1:
-                next_level = self.plan.levels[level.order + 1]
-                for task in next_level.tasks:
-                    task.description += f"\nContext from previous levels:\n{''.join(collective_narrative)}"
+    async def run_tasks(self) -> str:
+        """
+        Runs the plan as a DAG: each task starts as soon as the tasks producing
+        its input files, and earlier tasks touching the files it writes, have
+        finished, instead of waiting for its whole level.
+        Tasks already Completed in a checkpoint are not run again.
+        """
+        dependencies = task_dependencies(self.plan)
+        # A task that writes a file also waits for earlier tasks reading or
+        # writing it, the ordering level barriers used to guarantee
+        ordering = {task_id: set(deps) for task_id, deps in dependencies.items()}
+        for task_id, conflicts in derive_file_conflicts(self.plan).items():
+            ordering.setdefault(task_id, set()).update(conflicts)
+        self.dependencies = dependencies
+        tasks_by_id = {
+            task.id: task for level in self.plan.levels for task in level.tasks
+        }
+        task_narratives: Dict[str, str] = {
+            task.id: task.execution_narrative or ""
+            for task in tasks_by_id.values()
+            if task.status == "Completed"
+        }
+        waiting = {
+            task_id: set(deps) - task_narratives.keys()
+            for task_id, deps in ordering.items()
+            if task_id not in task_narratives
+        }
+        running: Dict[asyncio.Task, Task] = {}
+
+        for level in self.plan.levels:
+            if all(task.id in task_narratives for task in level.tasks):
+                self.mark_level_completed(level)
+
+        def start_ready_tasks():
+            for task_id, pending in list(waiting.items()):
+                if pending:
+                    continue
+                del waiting[task_id]
+                task = tasks_by_id[task_id]
+                self.mark_level_started(task.level)
+                upstream_context = self.format_upstream_context(
+                    dependencies[task_id]
+                )
+                running[asyncio.create_task(self.execute_task(task, upstream_context))] = task
 
+        start_ready_tasks()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running.keys(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        task_narratives[task.id] = future.result()
+                    except Exception:
+                        task.status = "Failed"
+                        task.end_time = datetime.now()
+                        task.level.status = "Failed"
+                        raise
+                    for pending in waiting.values():
+                        pending.discard(task.id)
+                    if all(t.id in task_narratives for t in task.level.tasks):
+                        self.mark_level_completed(task.level)
+                    await self.checkpoint()
+                start_ready_tasks()
+        except BaseException:
+            for future in running:
+                future.cancel()
+            await asyncio.shield(self.checkpoint())
+            raise
+        finally:
+            # Task agents on this plan are done with its workspace listing and runner
+            release_workspace_contexts(self.plan_directory)
+            release_command_runner(self.plan_directory)
+
+        collective_narrative = [
+            self.format_level_narrative(
+                level, "\n".join(task_narratives[task.id] for task in level.tasks)
+            )
+            for level in self.plan.levels
+        ]
         return "\n".join(collective_narrative)
 
     def format_level_narrative(self, level: Level, level_narrative: str) -> str:
         return f"=== Level {level.order} ===\n{level_narrative}\n"
 
-    async def execute_level(self, level: Level):
-        level.status = "In Progress"
-        level.start_time = datetime.now()
+    def format_upstream_context(self, dependency_ids: set) -> str:
+        """
+        Result records of a task's direct dependencies only, so prompt size stays
+        flat however deep the plan is; full narratives never travel downstream.
+        """
+        records = [
+            task.result.render(task.name)
+            for level in self.plan.levels
+            for task in level.tasks
+            if task.id in dependency_ids and task.result is not None
+        ]
+        return "\n".join(records)
+
+    def cache_scope(self) -> Dict[str, str]:
+        # Plans of the same agent pair share sub-tasks; upstream results and
+        # input hashes already bind a task to its context
+        return {
+            "agent_id": self.stratos.agent_id,
+            "requesting_agent": self.plan.requesting_agent or "",
+        }
+
+    def input_directories(self) -> List[str]:
+        # Plans live in <agent workspace>/plans/<id>; files sent to the agent
+        # land in its workspace
+        return [os.path.dirname(os.path.dirname(os.path.abspath(self.plan_directory)))]
+
+    def upstream_files(self, task: Task) -> List[str]:
+        dependency_ids = self.dependencies.get(task.id, set())
+        return sorted(
+            {
+                output_file
+                for level in self.plan.levels
+                for dependency in level.tasks
+                if dependency.id in dependency_ids
+                for output_file in dependency.output_files
+            }
+        )
 
-        tasks = [self.execute_task(task) for task in level.tasks]
-        level_results = await asyncio.gather(*tasks)
+    def build_task_result(self, task: Task, result: str) -> TaskResult:
+        if result.startswith(("ERROR:", "Error:")):
+            status = "failed"
+        elif result.startswith("MAX_ACTIONS_REACHED:"):
+            status = "incomplete"
+        else:
+            status = "succeeded"
 
-        level.status = "Completed"
-        level.end_time = datetime.now()
+        max_chars = int(
+            os.getenv("TASK_RESULT_SUMMARY_CHARS", DEFAULT_RESULT_SUMMARY_CHARS)
+        )
+        summary = " ".join(result.split())
+        if len(summary) > max_chars:
+            summary = f"{summary[:max_chars]}... [truncated]"
+
+        output_files = []
+        for output_file in task.output_files:
+            path = os.path.join(self.plan_directory, output_file)
+            exists = os.path.isfile(path)
+            output_files.append(
+                {
+                    "path": output_file,
+                    "exists": exists,
+                    "size": os.path.getsize(path) if exists else 0,
+                }
+            )
+        return TaskResult(status, summary, output_files)
 
-        level_narrative = "\n".join(level_results)
-        return level_narrative
+    def mark_level_started(self, level: Level):
+        if level.status == "Pending":
+            level.status = "In Progress"
+            level.start_time = datetime.now()
 
-    async def execute_task(self, task: Task):
-        task.status = "In Progress"
-        task.start_time = datetime.now()
+    def mark_level_completed(self, level: Level):
+        if level.status == "Completed":
+            return
+        level.status = "Completed"
+        level.start_time = level.start_time or datetime.now()
+        level.end_time = datetime.now()
 
-        self.logger.info(f"Starting execution of task: {task.name}")
+    async def execute_task(self, task: Task, upstream_context: str = ""):
+        with span(
+            task.name,
+            "task",
+            lane_name=f"Task {task.name}",
+            task_id=task.id,
+            agent_type=task.agent_type,
+        ) as trace_args:
+            result = await self._execute_task(task, upstream_context, trace_args)
+            trace_args["status"] = task.result.status if task.result else None
+            return result
 
-        task_agent = TaskAgent(
-            task,
-            self.llm,
-            self.logger,
-            MAX_AGENT_ACTIONS,
-            self.agent_factory,
-            self.plan,
-            self.plan_directory,
-            self.get_plan_status(),
-        )
-        await task_agent.initialize()
-        result, task_narrative = await task_agent.execute()
+    async def _execute_task(self, task: Task, upstream_context: str, trace_args: dict):
+        cache_key = None
+        if self.task_cache is not None:
+            cache_key = await self.task_cache.compute_key(
+                task,
+                self.plan_directory,
+                self.cache_scope(),
+                upstream_context,
+                self.upstream_files(task),
+                self.input_directories(),
+            )
+        if cache_key is not None:
+            if await self.task_cache.restore(cache_key, task, self.plan_directory):
+                task.status = "Completed"
+                task.start_time = task.end_time = datetime.now()
+                trace_args["cache_hit"] = True
+                self.logger.info(f"Task restored from cache: {task.name}")
+                return task.execution_narrative
+
+        queued_at = time.time()
+        async with self.scheduler.slot(self.plan.id, self.priority):
+            started_at = time.time()
+            record_span("queue wait", "scheduler", queued_at, started_at)
+            trace_args["queue_wait_ms"] = round((started_at - queued_at) * 1000, 3)
+            task.status = "In Progress"
+            task.start_time = datetime.now()
+            await self.checkpoint()
+
+            self.logger.info(f"Starting execution of task: {task.name}")
+
+            if is_process_mode():
+                pool = get_task_worker_pool(self.logger.name, self.llm.model)
+                result, task_narrative = await pool.run_task(
+                    self.plan.to_dict(),
+                    task.id,
+                    self.plan_directory,
+                    self.get_plan_status(),
+                    upstream_context,
+                )
+            else:
+                task_agent = TaskAgent(
+                    task,
+                    self.llm,
+                    self.logger,
+                    MAX_AGENT_ACTIONS,
+                    self.agent_factory,
+                    self.plan,
+                    self.plan_directory,
+                    self.get_plan_status(),
+                    upstream_context,
+                )
+                await task_agent.initialize()
+                result, task_narrative = await task_agent.execute()
 
         task.status = "Completed"
         task.end_time = datetime.now()
         task.output_message = result
+        task.result = self.build_task_result(task, result)
+        task.execution_narrative = (
+            f"Agent {task.agent_type} - Task: {task.name}\n{task_narrative}"
+        )
 
         self.logger.info(f"Task completed: {task.name}")
 
-        return f"Agent {task.agent_type} - Task: {task.name}\n{task_narrative}"
+        if cache_key is not None:
+            await self.task_cache.store(cache_key, task, self.plan_directory)
+        return task.execution_narrative
 
     def get_plan_status(self) -> str:
         status = []
@@ -105,7 +366,7 @@ class PlanExecutor:
         with open(narrative_path, "w") as f:
             f.write("\n".join(self.collective_narrative))
 
-    async def update_plan_status(self, level: Level):
+    async def update_plan_status(self):
         self.plan.last_updated = datetime.now()
         if all(level.status == "Completed" for level in self.plan.levels):
             self.plan.status = "Completed"
@@ -126,6 +387,7 @@ class TaskAgent:
         plan: Plan,
         plan_directory: str,
         plan_status: str,
+        upstream_context: str = "",
     ):
         self.task = task
         self.llm = llm
@@ -137,7 +399,9 @@ class TaskAgent:
         self.plan = plan
         self.plan_directory = plan_directory
         self.arcane_architecture = None
+        self.runtime = None
         self.plan_status = plan_status
+        self.upstream_context = upstream_context
         self.input_files = task.input_files
         self.output_files = task.output_files
         self.task_agent_config = None
@@ -150,8 +414,13 @@ class TaskAgent:
         return f"{result[:max_length]}... [Action result truncated for legibility]"
 
     async def initialize(self):
-        directory_contents = self.get_directory_contents()
         plan_overview = self.get_plan_overview()
+        upstream_section = (
+            "Results of the tasks that produce my inputs "
+            f"(read their output files for details):\n{self.upstream_context}"
+            if self.upstream_context
+            else ""
+        )
 
         task_agent_config = {
             "name": f"Task_{self.task.id}",
@@ -161,10 +430,8 @@ class TaskAgent:
             "specific_context": f"""I am a task-specific agent for the task: {self.task.description}
             My working directory is: {self.plan_directory}
 
-            Project Directory Structure and File Contents:
-            ============
-            {directory_contents}
-            ============
+            The project directory structure and file contents are provided in the
+            working directory section of my system prompt.
 
             Overall Plan Overview:
             {plan_overview}
@@ -176,39 +443,26 @@ class TaskAgent:
             - I am working on Level {self.task.level.order}
             - My specific task is: {self.task.name}
             - Task description: {self.task.description}
+            {upstream_section}
             """,
             "specific_actions": [],
             "personality": "I am focused and efficient in completing my assigned task.",
             "work_directory": self.plan_directory,
+            "workspace_extensions": TASK_WORKSPACE_EXTENSIONS,
             "common_actions": [],
             "port": "n/a",
         }
         self.task_agent_config = task_agent_config
-        self.arcane_architecture = self.agent_factory.create_agent(
-            task_agent_config,
-            task_agent_config["common_actions"],
-            self.llm,
-            self.logger,
-            get_environment_variable("ANT_API_KEY"),
-        ).arcane_architecture
-
-    def get_directory_contents(self):
-        structure = []
-        for root, dirs, files in os.walk(self.plan_directory):
-            level = root.replace(self.plan_directory, "").count(os.sep)
-            indent = " " * 4 * level
-            structure.append(f"{indent}{os.path.basename(root)}/")
-            subindent = " " * 4 * (level + 1)
-            for f in files:
-                if f.endswith((".py", ".yaml", ".txt", ".json", ".md", ".csv")):
-                    file_path = os.path.join(root, f)
-                    relative_path = os.path.relpath(file_path, self.plan_directory)
-                    structure.append(f"{subindent}{relative_path}")
-                    with open(file_path, "r") as file:
-                        content = file.read()
-                    structure.append(f"{subindent}Content of {relative_path}:")
-                    structure.append(f"{subindent}{content}")
-        return "\n".join(structure)
+        # Imported here: the runtime imports ArcaneArchitecture, which imports this module
+        from ARCANE.planning.task_agent_runtime import get_task_agent_runtime
+
+        self.runtime = get_task_agent_runtime(self.llm, self.logger, self.agent_factory)
+        self.arcane_architecture = self.runtime.acquire(task_agent_config)
+
+    def release(self):
+        if self.arcane_architecture is not None:
+            self.runtime.release(self.arcane_architecture)
+            self.arcane_architecture = None
 
     def get_plan_overview(self):
         overview = f"Plan: {self.plan.name}\nDescription: {self.plan.description}\n\n"
@@ -223,7 +477,8 @@ class TaskAgent:
     async def execute(self):
         try:
             while self.action_count < self.max_actions:
-                action = await self.get_next_action_with_retry()
+                with span("choose action", "agent", action_index=self.action_count):
+                    action = await self.get_next_action_with_retry()
                 
                 if action is None:
                     self.logger.error(f"Failed to determine next action for task {self.task.name} after retries")
@@ -232,7 +487,9 @@ class TaskAgent:
                 if action["action"] == "declare_complete":
                     return action["params"]["message"], "\n".join(self.narrative)
 
-                success, result = await self.arcane_architecture.execute_action(action, None)
+                with span(f"action {action['action']}", "action") as trace_args:
+                    success, result = await self.arcane_architecture.execute_action(action, None)
+                    trace_args["success"] = success
                 summarized_result = self.summarize_action_result(action["action"], str(result))
                 self.narrative.append(f"Action: {action['action']} - Result: {summarized_result}")
                 self.action_count += 1
@@ -241,6 +498,8 @@ class TaskAgent:
         except Exception as e:
             self.logger.error(f"Error executing task {self.task.name}: {str(e)}")
             return f"Error: {str(e)}", f"Error occurred: {str(e)}"
+        finally:
+            self.release()
 
     async def get_next_action_with_retry(self, max_retries: int = 3, initial_delay: float = 2.0) -> Optional[dict]:
         delay = initial_delay
@@ -274,22 +533,36 @@ class TaskAgent:
 
     async def determine_next_action(self):
         context = self.create_task_context()
-        system_message = self.create_system_message()
-        action_prompt = self.create_action_prompt(context)
         tool_config = self.llm.get_tool_config(
             "create_action", self.task_agent_config["name"], isolated_agent=True
         )
 
-        full_prompt = f"{system_message}\n\n{action_prompt}"
+        # Stable segments first, so the workspace listing and per-step context
+        # never break the cacheable prefix ahead of the action instructions
+        agent_segment, task_segment, workspace_segment = (
+            await self.create_system_segments()
+        )
+        instructions_segment, context_segment = self.create_action_prompt(context)
+        prompt = [
+            agent_segment,
+            task_segment,
+            instructions_segment,
+            workspace_segment,
+            context_segment,
+        ]
         # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
         action_wrapper = await self.llm.create_chat_completion(
-            full_prompt, context, tool_config
+            prompt, context, tool_config
         )
 
         return action_wrapper
 
-    def create_system_message(self) -> str:
-        base_system_message = self.arcane_architecture.create_system_message()
+    async def create_system_segments(self) -> List[PromptSegment]:
+        # The agent prompt and task extension stay fixed for the lifetime of the
+        # task, so they form the cached prefix ahead of the workspace listing.
+        agent_segment, workspace_segment = (
+            await self.arcane_architecture.create_system_segments()
+        )
         task_specific_extension = f"""
         You are currently a task-specific agent working on the following task:
         Task Name: {self.task.name}
@@ -303,7 +576,11 @@ class TaskAgent:
         
         You are part of a larger plan and should focus on completing your specific task efficiently while adhering to the file management guidelines.
         """
-        return f"{base_system_message}\n\n{task_specific_extension}"
+        return [
+            agent_segment,
+            stable_segment(task_specific_extension),
+            workspace_segment,
+        ]
 
     def create_task_context(self):
         return f"""
@@ -314,12 +591,9 @@ class TaskAgent:
         Expected Output Files: {', '.join(self.output_files) if self.output_files else 'None'}
         """
 
-    def create_action_prompt(self, context: str) -> str:
+    def create_action_prompt(self, context: str) -> List[PromptSegment]:
         available_actions = ", ".join(self.get_available_actions())
-        return f"""
-        CONTEXT:
-        {context}
-
+        instructions = f"""
         AVAILABLE ACTIONS:
         {available_actions}
 
@@ -344,6 +618,15 @@ class TaskAgent:
 
         Ensure that you only use actions from the list of available actions provided and include all necessary parameters for the chosen action. Do not include any explanatory text outside of this JSON structure.
         """
+        return [
+            stable_segment(instructions),
+            volatile_segment(
+                f"""
+        CONTEXT:
+        {context}
+        """
+            ),
+        ]
 
     def get_available_actions(self):
         # Based on the actions given ot this agent, we should also fetch their descriptions from some static file.
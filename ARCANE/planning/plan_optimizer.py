@@ -0,0 +1,155 @@
+import os
+from typing import Any, Dict, List, Set, Tuple
+
+from ARCANE.planning.plan_structures import Plan, Level, Task
+from ARCANE.planning.task_graph import (
+    critical_path_length,
+    derive_dependencies,
+    derive_file_conflicts,
+    get_depths,
+    task_dependencies,
+)
+
+# Tasks with descriptions shorter than this may be merged with a sibling
+DEFAULT_MERGE_MAX_CHARS = 200
+# Merging trades parallelism for fewer agents, so it is off unless raised above 1
+DEFAULT_MERGE_MAX_TASKS = 1
+
+
+class PlanOptimizer:
+    """
+    Reshapes an LLM-generated plan before it runs. Levels are rebuilt from the
+    dependencies the tasks' file declarations actually imply, so tasks the LLM
+    put in sequence for no reason run together. A task that declares no input
+    files keeps depending on the whole previous level, since nothing says what
+    it reads. When enabled, small sibling tasks of the same agent type with the
+    same dependencies and declared outputs are merged into one task. The
+    resulting dependencies are stored on each task (Task.depends_on) and are
+    what the executor runs with.
+    """
+
+    def __init__(
+        self,
+        merge_max_chars: int = DEFAULT_MERGE_MAX_CHARS,
+        merge_max_tasks: int = DEFAULT_MERGE_MAX_TASKS,
+    ):
+        self.merge_max_chars = merge_max_chars
+        self.merge_max_tasks = merge_max_tasks
+
+    @classmethod
+    def from_env(cls) -> "PlanOptimizer":
+        return cls(
+            merge_max_chars=int(
+                os.getenv("PLAN_MERGE_MAX_CHARS", DEFAULT_MERGE_MAX_CHARS)
+            ),
+            merge_max_tasks=int(
+                os.getenv("PLAN_MERGE_MAX_TASKS", DEFAULT_MERGE_MAX_TASKS)
+            ),
+        )
+
+    def optimize(self, plan: Plan) -> Dict[str, Any]:
+        """Rewrites plan.levels in place and returns a before/after report."""
+        report = {
+            "levels_before": sum(1 for level in plan.levels if level.tasks),
+            "critical_path_before": critical_path_length(task_dependencies(plan)),
+            "tasks_before": sum(len(level.tasks) for level in plan.levels),
+        }
+
+        dependencies = self.true_dependencies(plan)
+        depths = get_depths(dependencies)
+        tasks = [task for level in sorted(plan.levels, key=lambda l: l.order) for task in level.tasks]
+
+        grouped: Dict[int, List[Task]] = {}
+        for task in tasks:
+            grouped.setdefault(depths[task.id], []).append(task)
+
+        merged = 0
+        # original task id -> (resulting task, ids of the original tasks it covers)
+        replaced_by: Dict[str, Task] = {}
+        members: Dict[str, List[str]] = {}
+        plan.levels = []
+        for order in sorted(grouped):
+            level = Level(order)
+            for task, covered in self.merge_small_tasks(grouped[order], dependencies):
+                level.add_task(task)
+                members[task.id] = covered
+                for task_id in covered:
+                    replaced_by[task_id] = task
+            merged += len(grouped[order]) - len(level.tasks)
+            plan.add_level(level)
+
+        for level in plan.levels:
+            for task in level.tasks:
+                task.depends_on = sorted(
+                    {
+                        replaced_by[dep].id
+                        for task_id in members[task.id]
+                        for dep in dependencies[task_id]
+                    }
+                    - {task.id}
+                )
+
+        report.update(
+            {
+                "levels_after": len(plan.levels),
+                "critical_path_after": critical_path_length(task_dependencies(plan)),
+                "tasks_after": sum(len(level.tasks) for level in plan.levels),
+                "tasks_merged": merged,
+            }
+        )
+        return report
+
+    @staticmethod
+    def true_dependencies(plan: Plan) -> Dict[str, Set[str]]:
+        dependencies = derive_dependencies(plan, fallback=False)
+        level_order = derive_dependencies(plan)
+        for level in plan.levels:
+            for task in level.tasks:
+                if not task.input_files:
+                    dependencies[task.id] = set(level_order[task.id])
+        for task_id, conflicts in derive_file_conflicts(plan).items():
+            dependencies[task_id] |= conflicts
+        return dependencies
+
+    def merge_small_tasks(
+        self, tasks: List[Task], dependencies: Dict[str, Set[str]]
+    ) -> List[Tuple[Task, List[str]]]:
+        """Returns (task, ids of the original tasks it covers) pairs."""
+        if self.merge_max_tasks < 2:
+            return [(task, [task.id]) for task in tasks]
+
+        result: List[Tuple[Task, List[str]]] = []
+        open_groups: Dict[tuple, List[Task]] = {}
+        for task in tasks:
+            if len(task.description) >= self.merge_max_chars or not task.output_files:
+                result.append((task, [task.id]))
+                continue
+            key = (task.agent_type, frozenset(dependencies[task.id]))
+            group = open_groups.setdefault(key, [])
+            group.append(task)
+            if len(group) == self.merge_max_tasks:
+                result.append((self.merge(group), [t.id for t in group]))
+                del open_groups[key]
+
+        for group in open_groups.values():
+            merged = group[0] if len(group) == 1 else self.merge(group)
+            result.append((merged, [t.id for t in group]))
+        return result
+
+    @staticmethod
+    def merge(tasks: List[Task]) -> Task:
+        description = "Complete each of the following parts:\n" + "\n".join(
+            f"{index}. {task.name}: {task.description}"
+            for index, task in enumerate(tasks, start=1)
+        )
+        input_files, output_files = [], []
+        for task in tasks:
+            input_files += [f for f in task.input_files if f not in input_files]
+            output_files += [f for f in task.output_files if f not in output_files]
+        return Task(
+            name=" + ".join(task.name for task in tasks),
+            description=description,
+            agent_type=tasks[0].agent_type,
+            input_files=input_files,
+            output_files=output_files,
+        )
@@ -1,8 +1,25 @@
+import asyncio
+import glob
 import json
 import os
+from datetime import datetime, timedelta
+from typing import List
 import aiofiles
 from ARCANE.planning.plan_structures import Plan
 
+# Plan statuses that mean execution was interrupted and can be picked up again
+RESUMABLE_STATUSES = ("Pending", "In Progress")
+# Execution traces sit next to their plan's checkpoint, outside the task workspace
+TRACE_SUFFIX = ".trace.json"
+
+
+def list_plan_files(base_path: str) -> List[str]:
+    return [
+        path
+        for path in glob.glob(os.path.join(base_path, "*.json"))
+        if not path.endswith(TRACE_SUFFIX)
+    ]
+
 
 class PlanPersistence:
     def __init__(self, base_path: str):
@@ -10,9 +27,18 @@ class PlanPersistence:
         os.makedirs(self.base_path, exist_ok=True)
 
     async def save_plan(self, plan: Plan):
+        # Write to a temp file and rename over the old checkpoint, so a crash
+        # mid-write never leaves a truncated plan behind
         file_path = os.path.join(self.base_path, f"{plan.id}.json")
-        async with aiofiles.open(file_path, "w") as f:
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        async with aiofiles.open(temp_path, "w") as f:
             await f.write(json.dumps(plan.to_dict(), indent=2))
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+        await asyncio.to_thread(os.replace, temp_path, file_path)
+
+    def trace_path(self, plan_id: str) -> str:
+        return os.path.join(self.base_path, f"{plan_id}{TRACE_SUFFIX}")
 
     async def load_plan(self, plan_id: str) -> Plan:
         file_path = os.path.join(self.base_path, f"{plan_id}.json")
@@ -22,3 +48,17 @@ class PlanPersistence:
 
     async def update_plan_status(self, plan: Plan):
         await self.save_plan(plan)
+
+    async def list_resumable_plans(self, max_age: float) -> List[Plan]:
+        """Plans that were interrupted within the last max_age seconds, oldest first."""
+        cutoff = datetime.now() - timedelta(seconds=max_age)
+        plans = []
+        for file_path in list_plan_files(self.base_path):
+            plan_id = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                plan = await self.load_plan(plan_id)
+            except (OSError, ValueError, KeyError):
+                continue
+            if plan.status in RESUMABLE_STATUSES and plan.last_updated >= cutoff:
+                plans.append(plan)
+        return sorted(plans, key=lambda plan: plan.last_updated)
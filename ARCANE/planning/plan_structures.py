@@ -1,8 +1,45 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
 
 
+class TaskResult:
+    """Compact record of a finished task, handed to the tasks that consume its outputs."""
+
+    def __init__(
+        self,
+        status: str,
+        summary: str,
+        output_files: List[Dict[str, Any]] = None,
+    ):
+        self.status = status
+        self.summary = summary
+        # [{"path": ..., "exists": bool, "size": int}]
+        self.output_files = output_files or []
+
+    def render(self, task_name: str) -> str:
+        outputs = ", ".join(
+            f"{ref['path']} ({ref['size']} bytes)" if ref["exists"] else f"{ref['path']} (missing)"
+            for ref in self.output_files
+        )
+        return (
+            f"- Task: {task_name} [{self.status}]\n"
+            f"  Summary: {self.summary}\n"
+            f"  Output files: {outputs or 'None'}"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "summary": self.summary,
+            "output_files": self.output_files,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TaskResult":
+        return cls(data["status"], data["summary"], data.get("output_files", []))
+
+
 class Task:
     def __init__(
         self,
@@ -22,10 +59,15 @@ class Task:
         self.start_time = None
         self.end_time = None
         self.output_message: str = None
+        self.execution_narrative: str = None
+        self.result: Optional[TaskResult] = None
         self.output_files: List[Dict[str, str]] = []
         self.level = level
         self.input_files = input_files or []
         self.output_files = output_files or []
+        # Ids of the tasks this one waits for, when fixed by the plan optimizer;
+        # None means they are derived from the levels and file declarations
+        self.depends_on: Optional[List[str]] = None
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -37,10 +79,13 @@ class Task:
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
             "output_message": self.output_message,
+            "execution_narrative": self.execution_narrative,
+            "result": self.result.to_dict() if self.result else None,
             "output_files": self.output_files,
             "level_order": self.level.order if self.level else None,
             "input_files": self.input_files,
             "output_files": self.output_files,
+            "depends_on": self.depends_on,
         }
 
     @classmethod
@@ -62,7 +107,12 @@ class Task:
             datetime.fromisoformat(data["end_time"]) if data["end_time"] else None
         )
         task.output_message = data.get("output_message")
+        task.execution_narrative = data.get("execution_narrative")
+        task.result = (
+            TaskResult.from_dict(data["result"]) if data.get("result") else None
+        )
         task.output_files = data.get("output_files", [])
+        task.depends_on = data.get("depends_on")
         return task
 
 
@@ -113,6 +163,11 @@ class Plan:
         self.creation_time = datetime.now()
         self.last_updated = self.creation_time
         self.work_directory: str = None
+        self.requesting_agent: str = None
+        # NIACL thread of the requesting conversation, for reporting back after a resume
+        self.thread_id: str = None
+        # Id of the completed plan this one was instantiated from, if any
+        self.template_id: str = None
 
     def add_level(self, level: Level):
         self.levels.append(level)
@@ -127,6 +182,9 @@ class Plan:
             "creation_time": self.creation_time.isoformat(),
             "last_updated": self.last_updated.isoformat(),
             "work_directory": self.work_directory,
+            "requesting_agent": self.requesting_agent,
+            "thread_id": self.thread_id,
+            "template_id": self.template_id,
         }
 
     @classmethod
@@ -137,4 +195,7 @@ class Plan:
         plan.creation_time = datetime.fromisoformat(data["creation_time"])
         plan.last_updated = datetime.fromisoformat(data["last_updated"])
         plan.work_directory = data.get("work_directory")
+        plan.requesting_agent = data.get("requesting_agent")
+        plan.thread_id = data.get("thread_id")
+        plan.template_id = data.get("template_id")
         return plan
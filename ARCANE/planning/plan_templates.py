@@ -0,0 +1,256 @@
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ARCANE.planning.plan_persistence import list_plan_files
+from ARCANE.planning.plan_structures import Plan, Level, Task
+
+DEFAULT_MIN_SIMILARITY = 0.85
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+_libraries: Dict[str, "PlanTemplateLibrary"] = {}
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _slug(text: str) -> str:
+    return "_".join(_tokenize(text))
+
+
+class PlanTemplateLibrary:
+    """
+    TF-IDF index over the plans an agent has already completed successfully.
+
+    A new request whose name and description are close enough (cosine similarity)
+    to a stored plan reuses that plan's level/task skeleton instead of asking the
+    LLM for a new plan. The index is rebuilt whenever the plans directory changes.
+    """
+
+    def __init__(self, plans_dir: str, min_similarity: float = DEFAULT_MIN_SIMILARITY):
+        self.plans_dir = plans_dir
+        self.min_similarity = min_similarity
+        self.templates: List[dict] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+        self.matrix: Optional[np.ndarray] = None
+        self._signature = None
+        # plan file path -> (mtime, plan data, or None if it is not reusable)
+        self._parsed: Dict[str, Tuple[float, Optional[dict]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, plans_dir: str) -> "PlanTemplateLibrary":
+        return cls(
+            plans_dir,
+            min_similarity=float(
+                os.getenv("PLAN_TEMPLATE_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY)
+            ),
+        )
+
+    @staticmethod
+    def is_reusable(plan_data: dict) -> bool:
+        if plan_data.get("status") != "Completed":
+            return False
+        for level in plan_data.get("levels", []):
+            for task in level.get("tasks", []):
+                result = task.get("result")
+                if result and result.get("status") != "succeeded":
+                    return False
+        return any(level.get("tasks") for level in plan_data.get("levels", []))
+
+    @staticmethod
+    def request_text(name: str, description: str) -> str:
+        return f"{name}\n{description}"
+
+    def refresh(self):
+        signature = []
+        for path in sorted(list_plan_files(self.plans_dir)):
+            try:
+                signature.append((path, os.path.getmtime(path)))
+            except OSError:
+                continue
+        signature = tuple(signature)
+        if signature == self._signature:
+            return
+
+        # Only plan files whose mtime changed are parsed again
+        parsed = {}
+        for path, mtime in signature:
+            cached = self._parsed.get(path)
+            if cached is not None and cached[0] == mtime:
+                parsed[path] = cached
+                continue
+            try:
+                with open(path, "r") as f:
+                    plan_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            parsed[path] = (mtime, plan_data if self.is_reusable(plan_data) else None)
+        self._parsed = parsed
+
+        self._build_index([data for _, data in parsed.values() if data is not None])
+        self._signature = signature
+
+    def _build_index(self, templates: List[dict]):
+        documents = [
+            _tokenize(self.request_text(t["name"], t["description"])) for t in templates
+        ]
+        vocabulary: Dict[str, int] = {}
+        for tokens in documents:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+
+        matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            for token in tokens:
+                matrix[row, vocabulary[token]] += 1.0
+        document_frequency = (matrix > 0).sum(axis=0)
+        idf = np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        self.templates = templates
+        self.vocabulary = vocabulary
+        self.idf = idf.astype(np.float32)
+        self.matrix = matrix
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in _tokenize(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                vector[index] += 1.0
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def match(self, name: str, description: str) -> Optional[Tuple[float, dict]]:
+        """Returns (similarity, plan data) of the closest template above the threshold."""
+        with self._lock:
+            self.refresh()
+            if not self.templates or not self.vocabulary:
+                return None
+            scores = self.matrix @ self._vectorize(self.request_text(name, description))
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if math.isnan(score) or score < self.min_similarity:
+                return None
+            return score, self.templates[best]
+
+    def instantiate(self, template: dict, name: str, description: str) -> Optional[Plan]:
+        """
+        Builds a fresh plan from a template's skeleton. The words that differ
+        between the template's description and the new one are substituted, as
+        whole words, into task names, descriptions and file names. Returns None
+        when the new description cannot be carried into the skeleton: it only
+        adds or drops words, or the differing words appear in no task.
+        """
+        description_change = self._differing_span(template["description"], description)
+        if description_change is not None and not all(description_change):
+            return None
+        substitutions = []
+        for change in (description_change, self._differing_span(template["name"], name)):
+            if change is None or not all(change):
+                continue
+            if all(change[0].lower() != old.lower() for old, _ in substitutions):
+                substitutions.append(change)
+        hits = [0] * len(substitutions)
+
+        def substitute(text: str) -> str:
+            for index, (old, new) in enumerate(substitutions):
+                text, count = re.subn(
+                    rf"(?<!\w){re.escape(old)}(?!\w)",
+                    new.replace("\\", r"\\"),
+                    text,
+                    flags=re.IGNORECASE,
+                )
+                hits[index] += count
+            return text
+
+        def substitute_file(path: str) -> str:
+            for index, (old, new) in enumerate(substitutions):
+                old_slug, new_slug = _slug(old), _slug(new)
+                if old_slug and new_slug:
+                    # Slug words are joined by "_", so boundaries are alphanumerics
+                    path, count = re.subn(
+                        rf"(?<![a-z0-9]){re.escape(old_slug)}(?![a-z0-9])",
+                        new_slug,
+                        path,
+                        flags=re.IGNORECASE,
+                    )
+                    hits[index] += count
+            return path
+
+        plan = Plan(name, description)
+        plan.template_id = template["id"]
+        # template task id -> (new task, template ids it waits for)
+        created: Dict[str, Tuple[Task, Optional[List[str]]]] = {}
+        for level_data in sorted(template["levels"], key=lambda level: level["order"]):
+            level = Level(level_data["order"])
+            for task_data in level_data["tasks"]:
+                task = Task(
+                    name=substitute(task_data["name"]),
+                    description=substitute(task_data["description"]),
+                    agent_type=task_data["agent_type"],
+                    input_files=[substitute_file(f) for f in task_data.get("input_files", [])],
+                    output_files=[substitute_file(f) for f in task_data.get("output_files", [])],
+                )
+                created[task_data.get("id") or task.id] = (task, task_data.get("depends_on"))
+                level.add_task(task)
+            plan.add_level(level)
+        # Dependencies fixed by the optimizer carry over to the new task ids
+        for task, depends_on in created.values():
+            if depends_on is not None:
+                task.depends_on = [created[dep][0].id for dep in depends_on if dep in created]
+        if description_change is not None and not hits[0]:
+            return None
+        return plan
+
+    @staticmethod
+    def _differing_span(old_text: str, new_text: str) -> Optional[Tuple[str, str]]:
+        """
+        The (old, new) run of words left after stripping the common leading and
+        trailing words, or None if the texts are the same. Either side may be
+        empty when words were only added or removed.
+        """
+        old_words, new_words = old_text.split(), new_text.split()
+        if [w.lower() for w in old_words] == [w.lower() for w in new_words]:
+            return None
+        prefix = 0
+        while (
+            prefix < min(len(old_words), len(new_words))
+            and old_words[prefix].lower() == new_words[prefix].lower()
+        ):
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < min(len(old_words), len(new_words)) - prefix
+            and old_words[-1 - suffix].lower() == new_words[-1 - suffix].lower()
+        ):
+            suffix += 1
+        return (
+            " ".join(old_words[prefix : len(old_words) - suffix]),
+            " ".join(new_words[prefix : len(new_words) - suffix]),
+        )
+
+
+def get_plan_template_library(plans_dir: str) -> Optional[PlanTemplateLibrary]:
+    """Returns the shared template library for a plans directory, or None if disabled."""
+    if os.getenv("PLAN_TEMPLATES_ENABLED", "true").lower() != "true":
+        return None
+    with _lock:
+        library = _libraries.get(plans_dir)
+        if library is None:
+            library = PlanTemplateLibrary.from_env(plans_dir)
+            _libraries[plans_dir] = library
+        return library
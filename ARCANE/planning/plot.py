@@ -1,4 +1,5 @@
 import json
+import os
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import colorsys
@@ -231,12 +232,95 @@ def create_dissertation_quality_layout(plan):
     return fig
 
 
+# Bar thickness and color per span category; nested spans share a lane, so
+# inner categories are drawn thinner on top of the task bar
+GANTT_CATEGORY_STYLES = {
+    "plan": (0.9, "rgba(120, 144, 156, 0.35)"),
+    "level": (0.8, "rgba(50, 171, 96, 0.6)"),
+    "task": (0.8, "rgba(66, 165, 245, 0.6)"),
+    "scheduler": (0.8, "rgba(239, 83, 80, 0.6)"),
+    "agent": (0.5, "rgba(255, 167, 38, 0.8)"),
+    "action": (0.5, "rgba(171, 71, 188, 0.8)"),
+    "llm": (0.25, "rgba(38, 50, 56, 0.9)"),
+}
+
+
+def create_execution_gantt(trace):
+    """
+    Timeline of an actual plan execution from the Chrome trace (<plan id>.trace.json,
+    next to the plan checkpoint) the plan executor writes: one row per lane (plan, levels, each task), with
+    queue waits, actions and LLM calls drawn inside their task's row.
+    """
+    events = [event for event in trace["traceEvents"] if event.get("ph") == "X"]
+    lane_names = {
+        event["tid"]: event["args"]["name"]
+        for event in trace["traceEvents"]
+        if event.get("ph") == "M" and event["name"] == "thread_name"
+    }
+    process_name = next(
+        (
+            event["args"]["name"]
+            for event in trace["traceEvents"]
+            if event.get("ph") == "M" and event["name"] == "process_name"
+        ),
+        "Plan",
+    )
+    origin = min((event["ts"] for event in events), default=0)
+
+    fig = go.Figure()
+    for category, (width, color) in GANTT_CATEGORY_STYLES.items():
+        spans = [event for event in events if event["cat"] == category]
+        if not spans:
+            continue
+        fig.add_trace(
+            go.Bar(
+                name=category,
+                orientation="h",
+                y=[lane_names.get(event["tid"], str(event["tid"])) for event in spans],
+                base=[(event["ts"] - origin) / 1e6 for event in spans],
+                x=[event["dur"] / 1e6 for event in spans],
+                width=width,
+                marker=dict(color=color, line=dict(width=0)),
+                text=[event["name"] for event in spans],
+                hovertext=[
+                    f"{event['name']}<br>{event['dur'] / 1e6:.2f}s<br>"
+                    + "<br>".join(f"{k}: {v}" for k, v in event["args"].items())
+                    for event in spans
+                ],
+                hoverinfo="text",
+                textposition="none",
+            )
+        )
+
+    lanes = [lane_names[tid] for tid in sorted(lane_names)]
+    fig.update_layout(
+        title=dict(text=f"Execution Timeline:<br>{process_name}", x=0.5),
+        barmode="overlay",
+        height=60 * len(lanes) + 200,
+        width=1200,
+        plot_bgcolor="rgba(240,240,240,0.8)",
+        paper_bgcolor="rgb(250,250,250)",
+        margin=dict(l=200, r=50, t=100, b=50),
+        legend=dict(orientation="h", yanchor="bottom", y=1.0, xanchor="right", x=1.0),
+    )
+    fig.update_xaxes(title_text="Seconds since plan start", zeroline=False)
+    fig.update_yaxes(
+        categoryorder="array", categoryarray=list(reversed(lanes)), showgrid=False
+    )
+    return fig
+
+
 def main():
     file_path = "f1f1b256-1c4e-44fc-bf78-d08cce9c5930.json"
     plan_data = read_json_file(file_path)
     fig = create_dissertation_quality_layout(plan_data)
     fig.write_html("dissertation_quality_plan_visualization.html", auto_open=True)
 
+    trace_path = file_path.replace(".json", ".trace.json")
+    if os.path.exists(trace_path):
+        fig = create_execution_gantt(read_json_file(trace_path))
+        fig.write_html("plan_execution_timeline.html", auto_open=True)
+
 
 if __name__ == "__main__":
     main()
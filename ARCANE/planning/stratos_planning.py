@@ -1,15 +1,26 @@
 # File: ARCANE/planning/stratos_planning.py
 
-from typing import Dict, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any
 from ARCANE.actions.action import Action
 from ARCANE.planning.plan_structures import Plan, Level, Task
 from ARCANE.planning.plan_persistence import PlanPersistence
 from ARCANE.planning.plan_executor import PlanExecutor
+from ARCANE.planning.plan_templates import get_plan_template_library
+from ARCANE.planning.plan_optimizer import PlanOptimizer
+from ARCANE.planning.task_scheduler import INTERACTIVE_PRIORITY, BACKGROUND_PRIORITY
 from util import get_environment_variable
 from llm.LLM import LLM
+from llm.client_pool import get_llm
+import asyncio
 import logging
 import os
 
+# Plans requested by the user-facing agent run ahead of background plan work
+INTERACTIVE_AGENTS = ("iris-5000",)
+
+# Interrupted plans older than this many seconds are not resumed on startup
+DEFAULT_PLAN_RESUME_MAX_AGE = 24 * 3600.0
+
 
 class DelegateAndExecuteTask(Action):
     def __init__(
@@ -22,6 +33,7 @@ class DelegateAndExecuteTask(Action):
         agent_factory,
         stratos,
         logger: logging.Logger,
+        thread_id: Optional[str] = None,
     ):
         self.plan_name = plan_name
         self.plan_description = plan_description
@@ -34,62 +46,113 @@ class DelegateAndExecuteTask(Action):
         self.plan_persistence = PlanPersistence(
             os.path.join(self.workspace_root, "plans")
         )
-        self.responsive_llm = LLM(logger, get_environment_variable("ANT_API_KEY"), get_environment_variable("CLAUDE_RESPONSIVE_MODEL"))
+        self.responsive_llm = get_llm(logger, get_environment_variable("ANT_API_KEY"), get_environment_variable("CLAUDE_RESPONSIVE_MODEL"))
         self.requesting_agent = requesting_agent
-
+        self.thread_id = thread_id
 
     async def execute(self) -> Tuple[bool, Optional[str]]:
         try:
             # from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
-            llm_response = await self._generate_plan_with_llm()
-            plan = self._create_plan_from_llm_response(llm_response)
+            plan = await self._plan_from_template()
+            if plan is None:
+                llm_response = await self._generate_plan_with_llm()
+                plan = self._create_plan_from_llm_response(llm_response)
+                if os.getenv("PLAN_OPTIMIZER_ENABLED", "true").lower() == "true":
+                    report = PlanOptimizer.from_env().optimize(plan)
+                    self.logger.info(f"Optimized plan {plan.name}: {report}")
 
             plan.work_directory = os.path.join(self.workspace_root, "plans", plan.id)
+            plan.requesting_agent = self.requesting_agent
+            plan.thread_id = self.thread_id
             os.makedirs(plan.work_directory, exist_ok=True)
 
             await self.plan_persistence.save_plan(plan)
 
+            priority = (
+                INTERACTIVE_PRIORITY
+                if self.requesting_agent.lower() in INTERACTIVE_AGENTS
+                else BACKGROUND_PRIORITY
+            )
             executor = PlanExecutor(
-                plan, self.agent_factory, self.stratos, self.llm, self.logger
+                plan,
+                self.agent_factory,
+                self.stratos,
+                self.llm,
+                self.logger,
+                priority=priority,
             )
+            return True, await self._run_plan(executor)
+        except Exception as e:
+            return False, f"Error delegating and executing task: {str(e)}"
 
-            collective_narrative = await executor.execute_plan()
-            
-            # Create a summarization prompt
-            summarization_prompt = f"""
-            Task Name: {plan.name}
-            Task Description: {plan.description}
-
-            You are an AI assistant tasked with summarizing the execution of a complex task. 
-            The full execution log is provided below. Your job is to create a concise yet 
-            informative summary of the task execution, highlighting key steps, decisions, 
-            and outcomes. Focus on the most important aspects and avoid unnecessary details.
-
-            Execution Log:
-            {collective_narrative}
-
-            Please provide a summary of the task execution in about 200-300 words.
-            """
-            
-            summarized_narrative = await self.responsive_llm.create_chat_completion(
-                summarization_prompt, 
-                "Summarize the task execution."
+    async def resume(self, plan_id: str) -> Tuple[bool, Optional[str]]:
+        """Continues a checkpointed plan without re-planning or re-running finished tasks."""
+        try:
+            executor = await PlanExecutor.resume(
+                plan_id, self.agent_factory, self.stratos, self.llm, self.logger
             )
+            return True, await self._run_plan(executor)
+        except Exception as e:
+            return False, f"Error resuming delegated task: {str(e)}"
 
-            if summarized_narrative:
-                summary_message = (
-                    f"Task '{plan.name}' was delegated and executed successfully. "
-                    f"Description: {plan.description}\n\n"
-                    # f"Execution Summary:\n{summarized_narrative}\n\n"
-                    f"This task was broken down into subtasks and executed by specialized agents"
-                    f"Please send back relevant files to: {self.requesting_agent}. Your goal is not achieved until any files (if necessary), have been communicated back appropriately via NIACL file handling"
-                )
-            else:
-                summary_message = "Error: Unable to generate summary."
+    async def _run_plan(self, executor: PlanExecutor) -> str:
+        plan = executor.plan
+        collective_narrative = await executor.execute_plan()
 
-            return True, summary_message
-        except Exception as e:
-            return False, f"Error delegating and executing task: {str(e)}"
+        # Create a summarization prompt
+        summarization_prompt = f"""
+        Task Name: {plan.name}
+        Task Description: {plan.description}
+
+        You are an AI assistant tasked with summarizing the execution of a complex task. 
+        The full execution log is provided below. Your job is to create a concise yet 
+        informative summary of the task execution, highlighting key steps, decisions, 
+        and outcomes. Focus on the most important aspects and avoid unnecessary details.
+
+        Execution Log:
+        {collective_narrative}
+
+        Please provide a summary of the task execution in about 200-300 words.
+        """
+        
+        summarized_narrative = await self.responsive_llm.create_chat_completion(
+            summarization_prompt, 
+            "Summarize the task execution."
+        )
+
+        if summarized_narrative:
+            summary_message = (
+                f"Task '{plan.name}' was delegated and executed successfully. "
+                f"Description: {plan.description}\n\n"
+                # f"Execution Summary:\n{summarized_narrative}\n\n"
+                f"This task was broken down into subtasks and executed by specialized agents"
+                f"Please send back relevant files to: {self.requesting_agent}. Your goal is not achieved until any files (if necessary), have been communicated back appropriately via NIACL file handling"
+            )
+        else:
+            summary_message = "Error: Unable to generate summary."
+
+        return summary_message
+
+    async def _plan_from_template(self) -> Optional[Plan]:
+        library = get_plan_template_library(os.path.join(self.workspace_root, "plans"))
+        if library is None:
+            return None
+        match = await asyncio.to_thread(
+            library.match, self.plan_name, self.plan_description
+        )
+        if match is None:
+            return None
+        similarity, template = match
+        plan = library.instantiate(template, self.plan_name, self.plan_description)
+        if plan is None:
+            self.logger.info(
+                f"Plan template {template['id']} ({similarity:.2f} similar) cannot be adapted to {self.plan_name}; planning from scratch"
+            )
+            return None
+        self.logger.info(
+            f"Reusing plan template {template['id']} ({similarity:.2f} similar) for {self.plan_name}"
+        )
+        return plan
 
     async def _generate_plan_with_llm(self) -> Dict[str, Any]:
 
@@ -160,3 +223,11 @@ class DelegateAndExecuteTask(Action):
             plan.add_level(level)
 
         return plan
+
+
+async def list_interrupted_plans(agent_id: str) -> List[Plan]:
+    max_age = float(os.getenv("PLAN_RESUME_MAX_AGE", DEFAULT_PLAN_RESUME_MAX_AGE))
+    plan_persistence = PlanPersistence(
+        os.path.join("aiversity_workspaces", agent_id, "plans")
+    )
+    return await plan_persistence.list_resumable_plans(max_age)
@@ -0,0 +1,98 @@
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict
+
+from llm.LLM import LLM
+from ARCANE.arcane_architecture import ArcaneArchitecture
+from ARCANE.agent_prompting.agent_prompts import generate_agent_prompt
+
+DEFAULT_POOL_SIZE = 32
+
+_runtimes: Dict[int, "TaskAgentRuntime"] = {}
+
+
+class TaskAgentShell:
+    """
+    The part of ArcaneSystem a task agent's architecture actually uses: a name
+    and a status. Task agents have no channels, personalization or responsive LLM.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.name = None
+        self.agent_id = None
+        self.status = "idle"
+        self.current_action = None
+
+    async def set_status(self, status: str, action_description: str = None):
+        self.status = status
+        self.current_action = action_description
+        self.logger.debug(f"Task agent {self.name} status: {status} - {action_description}")
+
+    async def unset_busy_status(self):
+        await self.set_status("idle")
+
+
+class TaskAgentRuntime:
+    """
+    Hands out ArcaneArchitecture instances for task agents. They share one LLM
+    client and the memoized prompt and tool catalog, and are recycled through a
+    pool instead of building an ArcaneSystem per task.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        logger: logging.Logger,
+        agent_factory,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.llm = llm
+        self.logger = logger
+        self.agent_factory = agent_factory
+        self.pool_size = pool_size
+        self.pool: Deque[ArcaneArchitecture] = deque()
+        self.stats = {"created": 0, "reused": 0}
+
+    def acquire(self, agent_config: dict) -> ArcaneArchitecture:
+        agent_prompt = generate_agent_prompt(agent_config)
+        if self.pool:
+            architecture = self.pool.pop()
+            architecture.rebind(agent_config["id"], agent_prompt, agent_config)
+            self.stats["reused"] += 1
+        else:
+            architecture = ArcaneArchitecture(
+                self.llm,
+                self.logger,
+                agent_config["id"],
+                agent_prompt,
+                agent_config,
+                TaskAgentShell(self.logger),
+                self.agent_factory,
+            )
+            self.stats["created"] += 1
+        architecture.arcane_system.name = agent_config["name"]
+        architecture.arcane_system.agent_id = agent_config["id"]
+        return architecture
+
+    def release(self, architecture: ArcaneArchitecture):
+        if len(self.pool) < self.pool_size:
+            architecture.clear_event_log()
+            self.pool.append(architecture)
+
+
+def get_task_agent_runtime(
+    llm: LLM, logger: logging.Logger, agent_factory
+) -> TaskAgentRuntime:
+    """Returns the runtime for an LLM client, creating it on first use."""
+    runtime = _runtimes.get(id(llm))
+    if runtime is None or runtime.llm is not llm:
+        runtime = TaskAgentRuntime(
+            llm,
+            logger,
+            agent_factory,
+            pool_size=int(os.getenv("TASK_AGENT_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        )
+        _runtimes[id(llm)] = runtime
+    return runtime
@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from ARCANE.planning.plan_structures import Task, TaskResult
+
+DEFAULT_CACHE_DIR = "task_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600.0
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_cache: Optional["TaskResultCache"] = None
+_cache_loaded = False
+
+
+def _hash_file(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _resolve(directory: str, relative_path: str) -> Optional[str]:
+    """Joins relative_path onto directory, refusing paths that escape it."""
+    root = os.path.abspath(directory)
+    path = os.path.abspath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+class TaskResultCache:
+    """
+    Memoizes finished plan tasks across plans.
+
+    A task is keyed on its normalized description, agent type, declared output
+    names, the content hashes of its declared input files, the result records
+    and output files of the tasks it depends on, and the agent and requesting
+    agent it runs for, so plans for different requests share the sub-tasks
+    they have in common. Inputs no upstream task produces are hashed where they
+    live: the plan directory or, failing that, the input directories (such as
+    the agent's workspace); a missing input is part of the key too. Only tasks
+    that declare their outputs are cached, since a hit restores them. An entry holds the
+    task's result plus copies of its output files, and a hit restores those files
+    into the new plan directory instead of running a TaskAgent. Entries expire
+    after ttl seconds and are evicted least-recently-used once the cache exceeds
+    max_bytes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "uncacheable": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "index.sqlite3")
+        with closing(self._connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER, last_access REAL, created REAL)"
+            )
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(entries)")]
+            if "created" not in columns:
+                connection.execute("ALTER TABLE entries ADD COLUMN created REAL DEFAULT 0")
+
+    @classmethod
+    def from_env(cls) -> Optional["TaskResultCache"]:
+        if os.getenv("TASK_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            cache_dir=os.getenv("TASK_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(os.getenv("TASK_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            ttl=float(os.getenv("TASK_CACHE_TTL", DEFAULT_TTL)),
+        )
+
+    @staticmethod
+    def normalize_description(description: str) -> str:
+        return " ".join(description.lower().split())
+
+    @staticmethod
+    def is_cacheable(task: Task) -> bool:
+        return bool(task.output_files)
+
+    @staticmethod
+    def locate_input(
+        name: str,
+        plan_directory: str,
+        upstream_files: List[str],
+        input_directories: List[str],
+    ) -> Optional[str]:
+        """Path an input is read from: produced upstream, or the first directory holding it."""
+        path = _resolve(plan_directory, name)
+        if name in upstream_files:
+            return path
+        for directory in [plan_directory] + input_directories:
+            candidate = _resolve(directory, name)
+            if candidate is not None and os.path.isfile(candidate):
+                return candidate
+        return path
+
+    def make_key(
+        self,
+        task: Task,
+        plan_directory: str,
+        scope: Dict[str, str],
+        upstream_context: str = "",
+        upstream_files: Optional[List[str]] = None,
+        input_directories: Optional[List[str]] = None,
+    ) -> Optional[str]:
+        upstream_files = sorted(upstream_files or [])
+        if not self.is_cacheable(task):
+            return None
+
+        def hashed(files: List[str], locate) -> List[list]:
+            hashes = []
+            for name in files:
+                path = locate(name)
+                hashes.append([name, _hash_file(path) if path else None])
+            return hashes
+
+        def locate_input(name: str) -> Optional[str]:
+            return self.locate_input(
+                name, plan_directory, upstream_files, input_directories or []
+            )
+
+        payload = json.dumps(
+            {
+                "scope": scope,
+                "description": self.normalize_description(task.description),
+                "agent_type": task.agent_type,
+                "inputs": hashed(sorted(task.input_files), locate_input),
+                "upstream_files": hashed(
+                    upstream_files, lambda name: _resolve(plan_directory, name)
+                ),
+                "upstream_results": hashlib.sha256(
+                    upstream_context.encode("utf-8")
+                ).hexdigest(),
+                "outputs": sorted(task.output_files),
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def compute_key(
+        self,
+        task: Task,
+        plan_directory: str,
+        scope: Dict[str, str],
+        upstream_context: str = "",
+        upstream_files: Optional[List[str]] = None,
+        input_directories: Optional[List[str]] = None,
+    ) -> Optional[str]:
+        """Returns None for tasks that must not be cached."""
+        # Hashing the inputs reads whole files, so keep it off the event loop
+        key = await asyncio.to_thread(
+            self.make_key,
+            task,
+            plan_directory,
+            scope,
+            upstream_context,
+            upstream_files,
+            input_directories,
+        )
+        if key is None:
+            self.stats["uncacheable"] += 1
+        return key
+
+    async def restore(self, key: str, task: Task, plan_directory: str) -> bool:
+        """On a hit, copies the cached outputs into plan_directory and fills in the task's results."""
+        entry = await asyncio.to_thread(self._restore, key, plan_directory)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False
+        self.stats["hits"] += 1
+        task.output_message = entry["output_message"]
+        task.execution_narrative = entry["execution_narrative"]
+        task.result = TaskResult.from_dict(entry["result"])
+        return True
+
+    async def store(self, key: str, task: Task, plan_directory: str):
+        if task.result is None or task.result.status != "succeeded":
+            return
+        entry = {
+            "output_message": task.output_message,
+            "execution_narrative": task.execution_narrative,
+            "result": task.result.to_dict(),
+            "output_files": list(task.output_files),
+        }
+        if await asyncio.to_thread(self._store, key, entry, plan_directory):
+            self.stats["stores"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        try:
+            with closing(self._connect()) as connection:
+                entries, size = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        return {
+            **self.stats,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _restore(self, key: str, plan_directory: str) -> Optional[Dict[str, Any]]:
+        entry_dir = self._entry_dir(key)
+        try:
+            with closing(self._connect()) as connection, connection:
+                row = connection.execute(
+                    "SELECT created FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if time.time() - (row[0] or 0) > self.ttl:
+                    connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    return None
+            with open(os.path.join(entry_dir, "entry.json"), "r") as f:
+                entry = json.load(f)
+            for output_file in entry["output_files"]:
+                target = _resolve(plan_directory, output_file)
+                if target is None:
+                    return None
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(entry_dir, "files", output_file), target)
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+        except (OSError, ValueError, KeyError, sqlite3.Error):
+            return None
+        return entry
+
+    def _store(self, key: str, entry: Dict[str, Any], plan_directory: str) -> bool:
+        entry_dir = self._entry_dir(key)
+        temp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            size = 0
+            for output_file in entry["output_files"]:
+                source = _resolve(plan_directory, output_file)
+                target = _resolve(os.path.join(temp_dir, "files"), output_file)
+                if source is None or target is None or not os.path.isfile(source):
+                    return False
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(source, target)
+                size += os.path.getsize(target)
+            with open(os.path.join(temp_dir, "entry.json"), "w") as f:
+                json.dump(entry, f)
+            size += os.path.getsize(os.path.join(temp_dir, "entry.json"))
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, last_access, created) VALUES (?, ?, ?, ?)",
+                    (key, size, time.time(), time.time()),
+                )
+                self._evict(connection)
+            return True
+        except (OSError, sqlite3.Error):
+            return False
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _evict(self, connection: sqlite3.Connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows: List[tuple] = connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            self.stats["evictions"] += 1
+
+
+def get_task_cache() -> Optional[TaskResultCache]:
+    """Returns the process-wide task cache, or None if it is disabled."""
+    global _cache, _cache_loaded
+    with _lock:
+        if not _cache_loaded:
+            _cache = TaskResultCache.from_env()
+            _cache_loaded = True
+        return _cache
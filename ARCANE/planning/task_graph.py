@@ -0,0 +1,103 @@
+import os
+from typing import Dict, List, Set
+
+from ARCANE.planning.plan_structures import Plan, Task
+
+
+def _normalize(path: str) -> str:
+    return os.path.normpath(path.strip()).lstrip(os.sep)
+
+
+def derive_dependencies(plan: Plan, fallback: bool = True) -> Dict[str, Set[str]]:
+    """
+    Maps each task id to the ids of the tasks it has to wait for.
+
+    A task depends on the earlier-level tasks that declare one of its input files
+    as an output. With fallback, a task none of whose inputs are produced by an
+    earlier task depends on every task of the previous non-empty level, which is
+    what the level-by-level execution guaranteed. Without it, such a task has no
+    dependencies at all.
+    """
+    dependencies: Dict[str, Set[str]] = {}
+    producers: Dict[str, List[Task]] = {}
+    previous_tasks: List[Task] = []
+
+    for level in sorted(plan.levels, key=lambda level: level.order):
+        for task in level.tasks:
+            matched = set()
+            for input_file in task.input_files:
+                for producer in producers.get(_normalize(input_file), []):
+                    matched.add(producer.id)
+            if not matched and fallback:
+                matched = {previous.id for previous in previous_tasks}
+            dependencies[task.id] = matched
+
+        # Register outputs only after the whole level, so same-level tasks stay independent
+        for task in level.tasks:
+            for output_file in task.output_files:
+                producers.setdefault(_normalize(output_file), []).append(task)
+        if level.tasks:
+            previous_tasks = level.tasks
+
+    return dependencies
+
+
+def derive_file_conflicts(plan: Plan) -> Dict[str, Set[str]]:
+    """
+    Ordering edges that are not data flow: a task that writes a file must stay
+    after earlier-level tasks that read or write the same file.
+    """
+    conflicts: Dict[str, Set[str]] = {}
+    touched: Dict[str, List[Task]] = {}
+
+    for level in sorted(plan.levels, key=lambda level: level.order):
+        for task in level.tasks:
+            conflicts[task.id] = {
+                other.id
+                for output_file in task.output_files
+                for other in touched.get(_normalize(output_file), [])
+            }
+        for task in level.tasks:
+            for path in set(task.input_files) | set(task.output_files):
+                touched.setdefault(_normalize(path), []).append(task)
+
+    return conflicts
+
+
+def task_dependencies(plan: Plan) -> Dict[str, Set[str]]:
+    """
+    The dependencies a plan runs with: those stored on its tasks by the plan
+    optimizer when every task has them, derived from levels and files otherwise.
+    Rebuilt levels cannot reproduce the optimizer's map, since the level-order
+    fallback would then point at the new previous level.
+    """
+    tasks = [task for level in plan.levels for task in level.tasks]
+    if tasks and all(task.depends_on is not None for task in tasks):
+        task_ids = {task.id for task in tasks}
+        return {
+            task.id: {dep for dep in task.depends_on if dep in task_ids}
+            for task in tasks
+        }
+    return derive_dependencies(plan)
+
+
+def get_depths(dependencies: Dict[str, Set[str]]) -> Dict[str, int]:
+    """Zero-based position of each task on the longest dependency chain leading to it."""
+    depths: Dict[str, int] = {}
+
+    def depth(task_id: str) -> int:
+        if task_id not in depths:
+            # Edges always point to earlier levels, so the recursion terminates
+            depths[task_id] = 1 + max(
+                (depth(dep) for dep in dependencies.get(task_id, ())), default=-1
+            )
+        return depths[task_id]
+
+    for task_id in dependencies:
+        depth(task_id)
+    return depths
+
+
+def critical_path_length(dependencies: Dict[str, Set[str]]) -> int:
+    """Number of tasks on the longest dependency chain, i.e. serial rounds needed."""
+    return 1 + max(get_depths(dependencies).values(), default=-1)
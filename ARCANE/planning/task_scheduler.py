@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+# Lower values are scheduled first
+INTERACTIVE_PRIORITY = 0
+BACKGROUND_PRIORITY = 10
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+_scheduler: Optional["TaskAgentScheduler"] = None
+
+
+class _Waiter:
+    def __init__(self, priority: int, plan_id: str, sequence: int):
+        self.priority = priority
+        self.plan_id = plan_id
+        self.sequence = sequence
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class TaskAgentScheduler:
+    """
+    Process-wide limit on concurrently running task agents.
+
+    When a slot frees up it goes to the waiter with the lowest priority value;
+    among equal priorities, to the plan currently holding the fewest slots, so
+    one wide plan cannot starve the others. Ties fall back to arrival order.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.running: Dict[str, int] = {}
+        self.waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self.stats = {
+            "granted": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "TaskAgentScheduler":
+        return cls(
+            int(os.getenv("TASK_AGENT_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        )
+
+    @property
+    def running_count(self) -> int:
+        return sum(self.running.values())
+
+    @asynccontextmanager
+    async def slot(self, plan_id: str, priority: int = BACKGROUND_PRIORITY):
+        await self.acquire(plan_id, priority)
+        try:
+            yield
+        finally:
+            self.release(plan_id)
+
+    async def acquire(self, plan_id: str, priority: int = BACKGROUND_PRIORITY):
+        if self.running_count < self.max_concurrency and not self.waiters:
+            self._grant(plan_id, 0.0)
+            return
+
+        waiter = _Waiter(priority, plan_id, next(self._sequence))
+        self.waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            elif not waiter.future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self.release(plan_id)
+            raise
+
+    def release(self, plan_id: str):
+        remaining = self.running.get(plan_id, 0) - 1
+        if remaining > 0:
+            self.running[plan_id] = remaining
+        else:
+            self.running.pop(plan_id, None)
+        self._wake_next()
+
+    def _wake_next(self):
+        while self.waiters and self.running_count < self.max_concurrency:
+            waiter = min(
+                self.waiters,
+                key=lambda w: (w.priority, self.running.get(w.plan_id, 0), w.sequence),
+            )
+            self.waiters.remove(waiter)
+            if waiter.future.done():
+                continue
+            self._grant(waiter.plan_id, time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _grant(self, plan_id: str, waited: float):
+        self.running[plan_id] = self.running.get(plan_id, 0) + 1
+        self.stats["granted"] += 1
+        self.stats["total_wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        queued_per_plan: Dict[str, int] = {}
+        for waiter in self.waiters:
+            queued_per_plan[waiter.plan_id] = queued_per_plan.get(waiter.plan_id, 0) + 1
+        granted = self.stats["granted"]
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running_count,
+            "queue_depth": len(self.waiters),
+            "oldest_wait_seconds": max(
+                (now - waiter.enqueued_at for waiter in self.waiters), default=0.0
+            ),
+            "average_wait_seconds": (
+                self.stats["total_wait_seconds"] / granted if granted else 0.0
+            ),
+            "running_per_plan": dict(self.running),
+            "queued_per_plan": queued_per_plan,
+        }
+
+
+def get_task_agent_scheduler() -> TaskAgentScheduler:
+    """Returns the scheduler shared by every plan executed in this process."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TaskAgentScheduler.from_env()
+    return _scheduler
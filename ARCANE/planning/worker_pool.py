@@ -0,0 +1,393 @@
+import asyncio
+import atexit
+import collections
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+import uuid
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from tracing import get_current_trace, record_span, start_trace
+
+_STOP = None
+# How often the result reader checks worker liveness while the queue is idle
+POLL_INTERVAL = 0.5
+# Seconds a job may run before its worker is killed and the job failed
+DEFAULT_JOB_TIMEOUT = 3600.0
+
+_pool: Optional["TaskWorkerPool"] = None
+_pool_lock = threading.Lock()
+
+
+class WorkerCrashedError(RuntimeError):
+    pass
+
+
+class JobTimeoutError(RuntimeError):
+    pass
+
+
+def _worker_main(worker_id: int, logger_name: str, model: str, jobs, results):
+    """Entry point of a worker process: runs TaskAgents for jobs pulled off the queue."""
+    try:
+        # Imported here so the coordinator does not pay for them when the pool is unused
+        from logging_util import setup_logger
+        from util import get_environment_variable
+        from llm.client_pool import get_llm
+        from ARCANE.agent_factory import AgentFactory
+
+        logger = setup_logger(f"{logger_name}-worker-{worker_id}")
+        llm = get_llm(logger, get_environment_variable("ANT_API_KEY"), model)
+        agent_factory = AgentFactory()
+    except Exception:
+        results.put(("init_error", None, worker_id, traceback.format_exc()))
+        return
+
+    async def run():
+        while True:
+            job = await asyncio.to_thread(jobs.get)
+            if job is _STOP:
+                return
+            try:
+                payload = await _run_job(job, llm, logger, agent_factory)
+                results.put(("result", job["job_id"], worker_id, payload))
+            except Exception:
+                results.put(("error", job["job_id"], worker_id, traceback.format_exc()))
+
+    asyncio.run(run())
+
+
+async def _run_job(job: Dict[str, Any], llm, logger, agent_factory) -> Dict[str, Any]:
+    from ARCANE.planning.plan_executor import MAX_AGENT_ACTIONS, TaskAgent
+    from ARCANE.planning.plan_structures import Plan
+
+    plan = Plan.from_dict(job["plan"])
+    task = next(
+        task
+        for level in plan.levels
+        for task in level.tasks
+        if task.id == job["task_id"]
+    )
+    task_agent = TaskAgent(
+        task,
+        llm,
+        logger,
+        MAX_AGENT_ACTIONS,
+        agent_factory,
+        plan,
+        job["plan_directory"],
+        job["plan_status"],
+        job["upstream_context"],
+    )
+    if not job.get("trace"):
+        await task_agent.initialize()
+        result, task_narrative = await task_agent.execute()
+        return {"result": result, "narrative": task_narrative, "spans": []}
+
+    # Action and LLM spans are recorded here and replayed into the
+    # coordinator's trace, on the lane of the task that ran them
+    with start_trace(f"Task {task.name}") as trace:
+        await task_agent.initialize()
+        result, task_narrative = await task_agent.execute()
+    spans = [
+        {
+            "name": event["name"],
+            "category": event["cat"],
+            "start": event["ts"] / 1_000_000,
+            "end": (event["ts"] + event["dur"]) / 1_000_000,
+            "args": event["args"],
+        }
+        for event in trace.events
+    ]
+    return {"result": result, "narrative": task_narrative, "spans": spans}
+
+
+class TaskWorkerPool:
+    """
+    Runs TaskAgents in a pool of worker processes so plan execution is not bound
+    to the coordinator's core and GIL.
+
+    Each worker has its own job queue and is handed one job at a time, so the
+    coordinator always knows which job a worker holds; a reader thread resolves
+    each job's future as results stream back. A worker that dies fails the job
+    it was given and is replaced, and a job that outruns job_timeout has its
+    worker killed, so a task crash or hang never takes the coordinator down.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        logger_name: str,
+        model: str,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+    ):
+        self.size = max(1, size)
+        self.logger_name = logger_name
+        self.model = model
+        self.job_timeout = job_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.workers: Dict[int, multiprocessing.Process] = {}
+        self.job_queues: Dict[int, Any] = {}
+        self.stats = {
+            "completed": 0,
+            "failed": 0,
+            "crashed": 0,
+            "respawned": 0,
+            "timed_out": 0,
+        }
+
+        self._worker_ids = itertools.count()
+        self._pending: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        # Jobs waiting for an idle worker
+        self._backlog: Deque[Dict[str, Any]] = collections.deque()
+        # worker id -> job id it was handed
+        self._assigned: Dict[int, str] = {}
+        self._lock = threading.RLock()
+        self._closed = False
+        # Set when a worker cannot start, since respawning it would fail the same way
+        self._init_error: Optional[str] = None
+
+        for _ in range(self.size):
+            self._spawn()
+        self._reader = threading.Thread(
+            target=self._read_results, name="task-worker-results", daemon=True
+        )
+        self._reader.start()
+        atexit.register(self.close)
+
+    def _spawn(self):
+        worker_id = next(self._worker_ids)
+        jobs = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(worker_id, self.logger_name, self.model, jobs, self.results),
+            name=f"task-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        with self._lock:
+            self.workers[worker_id] = process
+            self.job_queues[worker_id] = jobs
+
+    def _dispatch(self):
+        """Hands backlogged jobs to idle workers."""
+        with self._lock:
+            if self._closed:
+                return
+            for worker_id, jobs in self.job_queues.items():
+                if not self._backlog:
+                    return
+                if worker_id in self._assigned:
+                    continue
+                job = self._backlog.popleft()
+                self._assigned[worker_id] = job["job_id"]
+                jobs.put(job)
+
+    async def run_task(
+        self,
+        plan_data: Dict[str, Any],
+        task_id: str,
+        plan_directory: str,
+        plan_status: str,
+        upstream_context: str,
+    ) -> Tuple[str, str]:
+        if self._init_error is not None:
+            raise RuntimeError(f"Task worker pool failed to start:\n{self._init_error}")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Task worker pool is closed")
+            self._pending[job_id] = (loop, future)
+            self._backlog.append(
+                {
+                    "job_id": job_id,
+                    "plan": plan_data,
+                    "task_id": task_id,
+                    "plan_directory": plan_directory,
+                    "plan_status": plan_status,
+                    "upstream_context": upstream_context,
+                    "trace": get_current_trace() is not None,
+                }
+            )
+        self._dispatch()
+        try:
+            payload = await asyncio.wait_for(future, self.job_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            self._abandon(job_id)
+            raise JobTimeoutError(
+                f"Task {task_id} did not finish within {self.job_timeout:.0f}s"
+            )
+        except asyncio.CancelledError:
+            self._abandon(job_id)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(job_id, None)
+        for recorded in payload.get("spans", []):
+            record_span(
+                recorded["name"],
+                recorded["category"],
+                recorded["start"],
+                recorded["end"],
+                **recorded["args"],
+            )
+        return payload["result"], payload["narrative"]
+
+    def _abandon(self, job_id: str):
+        """Drops a job nobody waits for any more, killing the worker running it."""
+        with self._lock:
+            self._backlog = collections.deque(
+                job for job in self._backlog if job["job_id"] != job_id
+            )
+            worker_ids = [w for w, assigned in self._assigned.items() if assigned == job_id]
+            processes = [self.workers[w] for w in worker_ids if w in self.workers]
+        # The reader thread notices the exit, releases the slot and respawns
+        for process in processes:
+            process.kill()
+
+    def _read_results(self):
+        while not self._closed:
+            try:
+                kind, job_id, worker_id, payload = self.results.get(
+                    timeout=POLL_INTERVAL
+                )
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                return
+
+            if kind == "init_error":
+                self._init_error = payload
+                with self._lock:
+                    job_ids = list(self._pending)
+                    self._backlog.clear()
+                for pending_id in job_ids:
+                    self._resolve(
+                        pending_id,
+                        None,
+                        RuntimeError(f"Task worker pool failed to start:\n{payload}"),
+                    )
+                continue
+
+            with self._lock:
+                self._assigned.pop(worker_id, None)
+            if kind == "result":
+                self.stats["completed"] += 1
+                self._resolve(job_id, payload, None)
+            else:
+                self.stats["failed"] += 1
+                self._resolve(job_id, None, RuntimeError(payload))
+            self._check_workers()
+            self._dispatch()
+
+    def _check_workers(self):
+        with self._lock:
+            dead = [
+                (worker_id, process)
+                for worker_id, process in self.workers.items()
+                if not process.is_alive()
+            ]
+        if not dead or self._closed or self._init_error is not None:
+            return
+        for worker_id, process in dead:
+            with self._lock:
+                del self.workers[worker_id]
+                self.job_queues.pop(worker_id).close()
+                job_id = self._assigned.pop(worker_id, None)
+            self.stats["crashed"] += 1
+            if job_id is not None:
+                self._resolve(
+                    job_id,
+                    None,
+                    WorkerCrashedError(
+                        f"Task worker {worker_id} exited with code {process.exitcode}"
+                    ),
+                )
+            self._spawn()
+            self.stats["respawned"] += 1
+        self._dispatch()
+
+    def _resolve(self, job_id: str, payload: Any, error: Optional[Exception]):
+        with self._lock:
+            pending = self._pending.get(job_id)
+        if pending is None:
+            return
+        loop, future = pending
+
+        def set_outcome():
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(payload)
+
+        loop.call_soon_threadsafe(set_outcome)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "workers": len(self.workers),
+                "busy_workers": len(self._assigned),
+                "pending_jobs": len(self._pending),
+                "queued_jobs": len(self._backlog),
+            }
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            job_ids = list(self._pending)
+            self._backlog.clear()
+            workers = list(self.workers.values())
+            job_queues = list(self.job_queues.values())
+        for job_id in job_ids:
+            self._resolve(job_id, None, RuntimeError("Task worker pool was closed"))
+        for jobs in job_queues:
+            jobs.put(_STOP)
+        for process in workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def is_process_mode() -> bool:
+    return os.getenv("PLAN_EXECUTION_MODE", "inline").lower() == "process"
+
+
+def get_task_worker_pool(logger_name: str, model: str) -> TaskWorkerPool:
+    """Returns the worker pool of this process, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = int(os.getenv("PLAN_WORKER_PROCESSES", os.cpu_count() or 1))
+            job_timeout = float(
+                os.getenv("PLAN_WORKER_JOB_TIMEOUT", DEFAULT_JOB_TIMEOUT)
+            )
+            _pool = TaskWorkerPool(size, logger_name, model, job_timeout)
+        return _pool
+
+
+def get_task_worker_pool_stats() -> Optional[Dict[str, Any]]:
+    """Stats of the worker pool, or None if it has not been started."""
+    with _pool_lock:
+        return _pool.get_stats() if _pool is not None else None
+
+
+def close_task_worker_pool():
+    """Closes the worker pool; the next get_task_worker_pool starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
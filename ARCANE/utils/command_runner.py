@@ -0,0 +1,207 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024
+DEFAULT_MAX_CONCURRENCY = 2
+# Seconds a timed-out process group gets between SIGTERM and SIGKILL
+KILL_GRACE_PERIOD = 2.0
+READ_CHUNK_SIZE = 64 * 1024
+# Agent ids of the short-lived agents that run a single plan task
+TASK_AGENT_PREFIX = "Task_"
+
+_lock = threading.Lock()
+_runners: Dict[str, "CommandRunner"] = {}
+
+
+class CappedOutput:
+    """
+    Keeps the first and last limit/2 bytes of a stream and counts what falls in
+    between, so a runaway command cannot grow memory or flood the prompt.
+    """
+
+    def __init__(self, limit: int):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, chunk: bytes):
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail += chunk
+        overflow = len(self.tail) - self.tail_limit
+        if overflow > 0:
+            del self.tail[:overflow]
+            self.dropped += overflow
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n... [{self.dropped} bytes of output truncated] ...\n{tail}"
+
+
+class CommandResult:
+    def __init__(
+        self,
+        returncode: Optional[int],
+        stdout: str,
+        stderr: str,
+        timed_out: bool,
+        truncated: bool,
+        duration: float,
+    ):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.truncated = truncated
+        self.duration = duration
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class CommandRunner:
+    """
+    Runs shell commands for one agent, or for all task agents of one plan,
+    without blocking the event loop. Each command gets its own process group,
+    which is killed as a whole on timeout or cancellation; output is read as it
+    is produced and capped per stream. At most max_concurrency commands of the
+    owner run at once.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "CommandRunner":
+        return cls(
+            timeout=float(os.getenv("COMMAND_TIMEOUT", DEFAULT_TIMEOUT)),
+            max_output_bytes=int(
+                os.getenv("COMMAND_MAX_OUTPUT_BYTES", DEFAULT_MAX_OUTPUT_BYTES)
+            ),
+            max_concurrency=int(
+                os.getenv("COMMAND_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+            ),
+        )
+
+    async def run(
+        self, command: str, cwd: str, timeout: Optional[float] = None
+    ) -> CommandResult:
+        timeout = self.timeout if timeout is None else timeout
+        async with self.semaphore:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_shell(
+                command,
+                cwd=cwd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            stdout = CappedOutput(self.max_output_bytes)
+            stderr = CappedOutput(self.max_output_bytes)
+            readers = asyncio.gather(
+                self._drain(process.stdout, stdout),
+                self._drain(process.stderr, stderr),
+            )
+            timed_out = False
+            try:
+                await asyncio.wait_for(asyncio.shield(readers), timeout)
+                await process.wait()
+            except asyncio.TimeoutError:
+                timed_out = True
+                await self._kill_group(process)
+            except BaseException:
+                await asyncio.shield(self._kill_group(process))
+                raise
+            finally:
+                # The pipes close once every process in the group has exited
+                try:
+                    await asyncio.wait_for(readers, KILL_GRACE_PERIOD)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    readers.cancel()
+
+            return CommandResult(
+                returncode=process.returncode,
+                stdout=stdout.text(),
+                stderr=stderr.text(),
+                timed_out=timed_out,
+                truncated=stdout.truncated or stderr.truncated,
+                duration=time.monotonic() - started,
+            )
+
+    @staticmethod
+    async def _drain(stream: asyncio.StreamReader, output: CappedOutput):
+        while True:
+            chunk = await stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            output.write(chunk)
+
+    @staticmethod
+    async def _kill_group(process: asyncio.subprocess.Process):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            pass
+        # Also takes down children that ignored SIGTERM or outlived the shell
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
+def _runner_owner(agent_id: str, work_directory: str) -> str:
+    # Task agents live for one task, so they share the runner of the plan
+    # whose directory they work in and the limit holds across the plan
+    if agent_id.startswith(TASK_AGENT_PREFIX):
+        return os.path.abspath(work_directory)
+    return agent_id
+
+
+def get_command_runner(agent_id: str, work_directory: str = "") -> CommandRunner:
+    """Returns the command runner of an agent or plan, so its concurrency limit is shared."""
+    owner = _runner_owner(agent_id, work_directory)
+    with _lock:
+        runner = _runners.get(owner)
+        if runner is None:
+            runner = CommandRunner.from_env()
+            _runners[owner] = runner
+        return runner
+
+
+def release_command_runner(plan_directory: str):
+    """Drops the runner shared by a finished plan's task agents."""
+    with _lock:
+        _runners.pop(os.path.abspath(plan_directory), None)
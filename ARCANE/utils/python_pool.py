@@ -0,0 +1,549 @@
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import select
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+DEFAULT_PRELOAD = "numpy,pandas"
+DEFAULT_CPU_SECONDS = 120
+DEFAULT_MEMORY_BYTES = 4 * 1024 * 1024 * 1024
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_MAX_CONCURRENCY = 4
+ZYGOTE_START_TIMEOUT = 60.0
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_pool: Optional["PythonInterpreterPool"] = None
+
+
+class PythonRunResult:
+    def __init__(
+        self,
+        returncode: int,
+        stdout: str,
+        stderr: str,
+        timed_out: bool = False,
+        file_access: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        # What the script touched under cwd (see _FileAccessTracker.save);
+        # None when the run was not traced (subprocess fallback)
+        self.file_access = file_access
+
+
+class PythonInterpreterPool:
+    """
+    Runs Python scripts by forking a warm "zygote" interpreter that has already
+    imported the commonly used modules, instead of starting `python <file>` from
+    scratch. Every run is a fresh fork, so it gets a clean __main__ namespace,
+    its own cwd and session, and CPU-time and address-space limits. If the
+    zygote cannot be started the script runs as a plain subprocess.
+    """
+
+    def __init__(
+        self,
+        preload: List[str],
+        cpu_seconds: int = DEFAULT_CPU_SECONDS,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.preload = preload
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.reader: Optional[asyncio.Task] = None
+        self.pending: Dict[int, Dict[str, asyncio.Future]] = {}
+        self.ids = itertools.count()
+        self.start_lock = asyncio.Lock()
+        self.zygote_failed = False
+        self.stats = {"zygote_runs": 0, "subprocess_runs": 0, "zygote_starts": 0}
+
+    @classmethod
+    def from_env(cls) -> "PythonInterpreterPool":
+        preload = os.getenv("PYTHON_POOL_PRELOAD", DEFAULT_PRELOAD)
+        return cls(
+            preload=[module.strip() for module in preload.split(",") if module.strip()],
+            cpu_seconds=int(os.getenv("PYTHON_RUN_CPU_SECONDS", DEFAULT_CPU_SECONDS)),
+            memory_bytes=int(os.getenv("PYTHON_RUN_MEMORY_BYTES", DEFAULT_MEMORY_BYTES)),
+            timeout=float(os.getenv("PYTHON_RUN_TIMEOUT", DEFAULT_TIMEOUT)),
+            max_concurrency=int(
+                os.getenv("PYTHON_POOL_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+            ),
+        )
+
+    async def run(self, script_path: str, cwd: str) -> PythonRunResult:
+        script_path = os.path.abspath(script_path)
+        cwd = os.path.abspath(cwd)
+        async with self.semaphore:
+            if await self._ensure_zygote():
+                try:
+                    result = await self._run_forked(script_path, cwd)
+                    self.stats["zygote_runs"] += 1
+                    return result
+                except ConnectionError:
+                    # The zygote died mid-request; the next run starts a new one
+                    pass
+            self.stats["subprocess_runs"] += 1
+            return await self._run_subprocess(script_path, cwd)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "zygote_alive": self.process is not None and self.process.returncode is None,
+            "preload": self.preload,
+        }
+
+    async def close(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5.0)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        if self.reader is not None:
+            self.reader.cancel()
+
+    async def _ensure_zygote(self) -> bool:
+        if self.zygote_failed:
+            return False
+        async with self.start_lock:
+            if self.process is not None and self.process.returncode is None:
+                return True
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(
+                filter(None, [_REPO_ROOT, env.get("PYTHONPATH")])
+            )
+            try:
+                self.process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-m",
+                    "ARCANE.utils.python_pool",
+                    ",".join(self.preload),
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    cwd=_REPO_ROOT,
+                    env=env,
+                )
+                ready = await asyncio.wait_for(
+                    self.process.stdout.readline(), ZYGOTE_START_TIMEOUT
+                )
+                if not json.loads(ready).get("ready"):
+                    raise RuntimeError(f"unexpected zygote greeting: {ready!r}")
+            except (OSError, ValueError, RuntimeError, asyncio.TimeoutError) as e:
+                print(f"Python zygote unavailable, falling back to subprocesses: {e}")
+                if self.process is not None and self.process.returncode is None:
+                    self.process.kill()
+                self.zygote_failed = True
+                return False
+            self.stats["zygote_starts"] += 1
+            self.reader = asyncio.create_task(self._read_responses(self.process))
+            return True
+
+    async def _read_responses(self, process: asyncio.subprocess.Process):
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                futures = self.pending.get(message["id"])
+                if futures is None:
+                    continue
+                future = futures["started"] if "pid" in message else futures["exited"]
+                if not future.done():
+                    future.set_result(message)
+        finally:
+            for futures in self.pending.values():
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("Python zygote exited"))
+
+    async def _run_forked(self, script_path: str, cwd: str) -> PythonRunResult:
+        run_id = next(self.ids)
+        loop = asyncio.get_running_loop()
+        futures = {"started": loop.create_future(), "exited": loop.create_future()}
+        self.pending[run_id] = futures
+        output_dir = tempfile.mkdtemp(prefix="python_run_")
+        request = {
+            "id": run_id,
+            "script": script_path,
+            "cwd": cwd,
+            "stdout": os.path.join(output_dir, "stdout"),
+            "stderr": os.path.join(output_dir, "stderr"),
+            "file_access": os.path.join(output_dir, "file_access.json"),
+            "cpu_seconds": self.cpu_seconds,
+            "memory_bytes": self.memory_bytes,
+        }
+        try:
+            self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            await self.process.stdin.drain()
+            pid = (await futures["started"])["pid"]
+            timed_out = False
+            try:
+                exited = await asyncio.wait_for(
+                    asyncio.shield(futures["exited"]), self.timeout
+                )
+            except asyncio.TimeoutError:
+                timed_out = True
+                _kill_session(pid)
+                exited = await futures["exited"]
+            except asyncio.CancelledError:
+                _kill_session(pid)
+                raise
+            try:
+                with open(request["file_access"], "r") as f:
+                    file_access = json.load(f)
+            except (OSError, ValueError):
+                file_access = None
+            return PythonRunResult(
+                exited["returncode"],
+                _read_text(request["stdout"]),
+                _read_text(request["stderr"]),
+                timed_out,
+                file_access,
+            )
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise ConnectionError(str(e))
+        finally:
+            self.pending.pop(run_id, None)
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    async def _run_subprocess(self, script_path: str, cwd: str) -> PythonRunResult:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            script_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+            return PythonRunResult(
+                process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+            )
+        except asyncio.TimeoutError:
+            _kill_session(process.pid)
+            stdout, stderr = await process.communicate()
+            return PythonRunResult(
+                process.returncode,
+                stdout.decode(errors="replace"),
+                stderr.decode(errors="replace"),
+                timed_out=True,
+            )
+        except asyncio.CancelledError:
+            _kill_session(process.pid)
+            raise
+
+
+def _kill_session(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, "r", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def get_python_pool() -> PythonInterpreterPool:
+    global _pool
+    if _pool is None:
+        _pool = PythonInterpreterPool.from_env()
+    return _pool
+
+
+async def close_python_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+# --- zygote side ----------------------------------------------------------
+
+
+def _repo_source_packages() -> Tuple[str, ...]:
+    try:
+        names = sorted(os.listdir(_REPO_ROOT))
+    except OSError:
+        return ()
+    return tuple(
+        os.path.join(_REPO_ROOT, name, "")
+        for name in names
+        if name == "__pycache__"
+        or os.path.isfile(os.path.join(_REPO_ROOT, name, "__init__.py"))
+    )
+
+
+def _repo_source_modules() -> Set[str]:
+    try:
+        names = os.listdir(_REPO_ROOT)
+    except OSError:
+        return set()
+    return {os.path.join(_REPO_ROOT, name) for name in names if name.endswith(".py")}
+
+
+class _FileAccessTracker:
+    """
+    Audit hook recording what a script's outcome can depend on under root: files
+    it reads and writes, directories it lists and paths it stats (including ones
+    that turn out to be missing). It also notes touching files outside root or
+    starting other processes, either of which makes the run impossible to replay.
+    """
+
+    # The interpreter's own files and the repo's source packages (lazy imports)
+    # are not inputs; anything else outside root, workspaces included, is
+    TRUSTED_PREFIXES = tuple(
+        os.path.join(os.path.abspath(prefix), "")
+        for prefix in {sys.prefix, sys.base_prefix, sys.exec_prefix}
+    ) + _repo_source_packages() + ("/dev/", "/proc/", "/sys/")
+    # Top-level repo modules, and the repo root itself, which imports list
+    TRUSTED_PATHS = (
+        _repo_source_modules()
+        | {_REPO_ROOT}
+        | {package.rstrip(os.sep) for package in _repo_source_packages()}
+    )
+    SPAWN_EVENTS = {
+        "subprocess.Popen",
+        "os.system",
+        "os.exec",
+        "os.posix_spawn",
+        "os.spawn",
+        "os.fork",
+        "os.forkpty",
+        "pty.spawn",
+    }
+    LISTING_EVENTS = {"os.listdir", "os.scandir"}
+
+    def __init__(self, root: str):
+        self.root = os.path.join(root, "")
+        self.first_access: Dict[str, str] = {}
+        self.written = set()
+        self.modified = set()
+        self.listed = set()
+        self.checked = set()
+        self.external = set()
+        self.spawned = False
+        self.active = True
+
+    def classify(self, path) -> Optional[str]:
+        """Absolute path if it is under root, None if it is irrelevant or external."""
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        if isinstance(path, os.PathLike):
+            path = os.fspath(path)
+        if not isinstance(path, str):
+            return None
+        path = os.path.abspath(path)
+        if path.startswith(self.root) or path == self.root.rstrip(os.sep):
+            return None if "__pycache__" in path else path
+        if path in self.TRUSTED_PATHS or path.startswith(self.TRUSTED_PREFIXES):
+            return None
+        self.external.add(path)
+        return None
+
+    def __call__(self, event: str, args: tuple):
+        if not self.active:
+            return
+        if event in self.SPAWN_EVENTS:
+            self.spawned = True
+        elif event in self.LISTING_EVENTS:
+            path = self.classify(args[0] if args and args[0] is not None else ".")
+            if path is not None:
+                self.listed.add(path)
+        elif event == "open":
+            self.record_open(*args)
+
+    def record_open(self, path, mode, flags):
+        path = self.classify(path)
+        if path is None:
+            return
+        if mode is None:
+            writing = (flags & os.O_ACCMODE) != os.O_RDONLY
+            # Anything but truncating or exclusive creation sees the old content
+            reading = not writing or not flags & (os.O_TRUNC | os.O_EXCL)
+        else:
+            writing = any(c in mode for c in "wax+")
+            reading = "w" not in mode and "x" not in mode
+        first = self.first_access.setdefault(path, "read" if reading else "write")
+        if writing:
+            self.written.add(path)
+            if first == "read":
+                # Read and then rewritten in place: the run is not repeatable
+                self.modified.add(path)
+
+    def watch_stat(self, stat_function):
+        # os.stat raises no audit event, but os.path.exists/isfile and pathlib
+        # checks go through it; a missing file the script looked for is an input too
+        def tracked(path, *args, **kwargs):
+            if self.active and not isinstance(path, int):
+                checked = self.classify(path)
+                if checked is not None and checked not in self.first_access:
+                    self.checked.add(checked)
+            return stat_function(path, *args, **kwargs)
+
+        return tracked
+
+    def save(self, path: str):
+        self.active = False
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "read": sorted(p for p, a in self.first_access.items() if a == "read"),
+                    "written": sorted(self.written),
+                    "modified": sorted(self.modified),
+                    "listed": sorted(self.listed),
+                    "checked": sorted(self.checked - self.written),
+                    "external": sorted(self.external)[:20],
+                    "spawned": self.spawned,
+                },
+                f,
+            )
+
+
+def _run_child(request: dict):
+    """Runs in the forked child; never returns."""
+    import resource
+    import runpy
+    import traceback
+
+    code = 1
+    tracker = None
+    try:
+        os.setsid()
+        os.chdir(request["cwd"])
+        if request["cpu_seconds"] > 0:
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (request["cpu_seconds"], request["cpu_seconds"])
+            )
+        if request["memory_bytes"] > 0:
+            resource.setrlimit(
+                resource.RLIMIT_AS, (request["memory_bytes"], request["memory_bytes"])
+            )
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        stdout = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        stderr = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        # Replacing fds 0 and 1 also drops the child's copy of the protocol pipes
+        os.dup2(devnull, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+
+        tracker = _FileAccessTracker(request["cwd"])
+        sys.addaudithook(tracker)
+        os.stat = tracker.watch_stat(os.stat)
+        os.lstat = tracker.watch_stat(os.lstat)
+
+        sys.argv = [request["script"]]
+        sys.path[0] = os.path.dirname(request["script"])
+        runpy.run_path(request["script"], run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Drop the zygote and runpy frames so the traceback reads like `python <file>`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["script"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if tracker is not None:
+                tracker.save(request["file_access"])
+        finally:
+            os._exit(code)
+
+
+def _zygote_main(preload: List[str]):
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    os.set_blocking(write_fd, False)
+    signal.set_wakeup_fd(write_fd)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def send(message: dict):
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+    children: Dict[int, int] = {}
+    buffer = b""
+    send({"ready": True})
+    while True:
+        try:
+            readable, _, _ = select.select([0, read_fd], [], [])
+        except InterruptedError:
+            continue
+        if read_fd in readable:
+            try:
+                os.read(read_fd, 4096)
+            except BlockingIOError:
+                pass
+        # Reap before reading requests so exits are reported promptly
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            run_id = children.pop(pid, None)
+            if run_id is not None:
+                send({"id": run_id, "returncode": os.waitstatus_to_exitcode(status)})
+        if 0 in readable:
+            data = os.read(0, 65536)
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                request = json.loads(line)
+                pid = os.fork()
+                if pid == 0:
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.SIG_DFL)
+                    os.close(read_fd)
+                    os.close(write_fd)
+                    _run_child(request)
+                children[pid] = request["id"]
+                send({"id": request["id"], "pid": pid})
+
+
+if __name__ == "__main__":
+    _zygote_main([module for module in sys.argv[1].split(",") if module])
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from ARCANE.utils.python_pool import PythonRunResult
+
+DEFAULT_CACHE_DIR = "run_cache"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Scripts containing this comment are always run
+NONDETERMINISTIC_MARKER = re.compile(r"#\s*aiversity:\s*nondeterministic", re.IGNORECASE)
+
+_lock = threading.Lock()
+_cache: Optional["PythonRunCache"] = None
+_cache_loaded = False
+
+
+def _hash_file(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _fingerprint(path: str) -> Optional[str]:
+    """Content hash of a file, hash of a directory's listing, or None if missing."""
+    if os.path.isdir(path):
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            return None
+        return "dir:" + hashlib.sha256("\0".join(names).encode("utf-8")).hexdigest()
+    return _hash_file(path)
+
+
+class PythonRunCache:
+    """
+    Remembers the last successful run of each script. An entry records the hash
+    of the script, of every work-directory file the run read, wrote or checked
+    for, and of the listing of every directory it listed; while all of those are
+    unchanged, running the script again returns the recorded output instead of
+    executing it. Runs that touched files outside the work directory or started
+    other processes are never cached.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["PythonRunCache"]:
+        if os.getenv("RUN_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        return cls(cache_dir=os.getenv("RUN_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+    @staticmethod
+    def is_nondeterministic(script_path: str) -> bool:
+        try:
+            with open(script_path, "r", errors="replace") as f:
+                return NONDETERMINISTIC_MARKER.search(f.read()) is not None
+        except OSError:
+            return True
+
+    async def lookup(self, script_path: str, cwd: str) -> Optional[PythonRunResult]:
+        return await asyncio.to_thread(self._lookup, script_path, cwd)
+
+    async def store(self, script_path: str, cwd: str, result: PythonRunResult):
+        if await asyncio.to_thread(self._store, script_path, cwd, result):
+            self.stats["stores"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+    def _entry_path(self, script_path: str, cwd: str) -> str:
+        key = hashlib.sha256(f"{cwd}\0{script_path}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _lookup(self, script_path: str, cwd: str) -> Optional[PythonRunResult]:
+        if self.is_nondeterministic(script_path):
+            self.stats["bypassed"] += 1
+            return None
+        try:
+            with open(self._entry_path(script_path, cwd), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            return None
+
+        unchanged = entry["script_hash"] == _hash_file(script_path) and all(
+            _fingerprint(path) == digest for path, digest in entry["files"].items()
+        )
+        if not unchanged:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return PythonRunResult(entry["returncode"], entry["stdout"], entry["stderr"])
+
+    def _store(self, script_path: str, cwd: str, result: PythonRunResult) -> bool:
+        access = result.file_access
+        if (
+            result.returncode != 0
+            or result.timed_out
+            or access is None
+            or access["modified"]
+            or access.get("external")
+            or access.get("spawned", True)
+            or self.is_nondeterministic(script_path)
+        ):
+            return False
+        files = {}
+        for kind in ("read", "written", "checked", "listed"):
+            for path in access.get(kind, []):
+                files[path] = _fingerprint(path)
+        entry = {
+            "script": script_path,
+            "script_hash": _hash_file(script_path),
+            "files": files,
+            "returncode": result.returncode,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        }
+        entry_path = self._entry_path(script_path, cwd)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            return False
+        return True
+
+
+def get_run_cache() -> Optional[PythonRunCache]:
+    """Returns the process-wide run cache, or None if it is disabled."""
+    global _cache, _cache_loaded
+    with _lock:
+        if not _cache_loaded:
+            _cache = PythonRunCache.from_env()
+            _cache_loaded = True
+        return _cache
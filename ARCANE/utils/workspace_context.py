@@ -0,0 +1,210 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_EXTENSIONS = (".py", ".yaml", ".txt", ".md", ".csv")
+# Roughly 50k tokens for the whole listing, 5k tokens for any single file
+DEFAULT_MAX_BYTES = 200_000
+DEFAULT_MAX_FILE_BYTES = 20_000
+# Seconds a render is reused without re-statting the tree; 0 always re-checks
+DEFAULT_REFRESH_INTERVAL = 0.0
+# Directories whose caches are kept; the least recently rendered is dropped first
+DEFAULT_MAX_CONTEXTS = 32
+
+_lock = threading.Lock()
+_contexts: "OrderedDict[Tuple[str, Tuple[str, ...]], WorkspaceContext]" = OrderedDict()
+
+
+class WorkspaceContext:
+    """
+    Cached, size-bounded rendering of a work directory's tree and file contents.
+
+    Directory listings are reused while the directory's mtime is unchanged and
+    file contents while (path, mtime, size) is unchanged, so a rebuild only
+    stats the tree and reads the files that actually changed. Files larger than
+    max_file_bytes are shown as a head excerpt, and once max_bytes of content
+    has been rendered the remaining files are listed without content.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        extensions: Tuple[str, ...] = DEFAULT_EXTENSIONS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+    ):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.refresh_interval = refresh_interval
+        self.stats = {"renders": 0, "rebuilds": 0, "file_reads": 0}
+
+        self._lock = threading.Lock()
+        # dir path -> (mtime_ns, sorted subdirectory names, sorted file names)
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        # file path -> (mtime_ns, size, content)
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        self._signature: Optional[tuple] = None
+        self._rendered = ""
+        self._checked_at = 0.0
+
+    @classmethod
+    def from_env(cls, root: str, extensions: Tuple[str, ...]) -> "WorkspaceContext":
+        return cls(
+            root,
+            extensions,
+            max_bytes=int(os.getenv("WORKSPACE_CONTEXT_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            max_file_bytes=int(
+                os.getenv("WORKSPACE_CONTEXT_MAX_FILE_BYTES", DEFAULT_MAX_FILE_BYTES)
+            ),
+            refresh_interval=float(
+                os.getenv("WORKSPACE_CONTEXT_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL)
+            ),
+        )
+
+    def render(self) -> str:
+        with self._lock:
+            self.stats["renders"] += 1
+            now = time.monotonic()
+            if self._signature is not None and now - self._checked_at < self.refresh_interval:
+                return self._rendered
+            self._checked_at = now
+
+            entries = []
+            self._scan(self.root, 0, entries)
+            signature = tuple(entries)
+            if signature != self._signature:
+                self._rendered = self._build(entries)
+                self._signature = signature
+                self.stats["rebuilds"] += 1
+            return self._rendered
+
+    async def render_async(self) -> str:
+        """render() on a worker thread, so the stat walk does not block the event loop."""
+        return await asyncio.to_thread(self.render)
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def _scan(self, directory: str, level: int, entries: list):
+        """Collects ("dir", path, level) and ("file", path, level, mtime, size) in walk order."""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._dirs.pop(directory, None)
+            return
+        cached = self._dirs.get(directory)
+        if cached is None or cached[0] != mtime:
+            subdirs, files = [], []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            subdirs.append(entry.name)
+                        elif entry.name.endswith(self.extensions):
+                            files.append(entry.name)
+            except OSError:
+                return
+            cached = (mtime, sorted(subdirs), sorted(files))
+            self._dirs[directory] = cached
+
+        entries.append(("dir", directory, level))
+        _, subdirs, files = cached
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append(("file", path, level + 1, stat.st_mtime_ns, stat.st_size))
+        for name in subdirs:
+            self._scan(os.path.join(directory, name), level + 1, entries)
+
+    def _build(self, entries: list) -> str:
+        structure = []
+        budget = self.max_bytes
+        live_dirs, live_files = set(), set()
+        for entry in entries:
+            if entry[0] == "dir":
+                live_dirs.add(entry[1])
+                indent = " " * 4 * entry[2]
+                structure.append(f"{indent}{os.path.basename(entry[1])}/")
+                continue
+
+            _, path, level, mtime, size = entry
+            live_files.add(path)
+            subindent = " " * 4 * level
+            relative_path = os.path.relpath(path, self.root)
+            structure.append(f"{subindent}{relative_path}")
+            if budget <= 0:
+                structure.append(
+                    f"{subindent}[Content omitted: workspace context budget reached. "
+                    f"Use view_file_contents to read {relative_path}]"
+                )
+                continue
+
+            content = self._read(path, mtime, size)
+            if len(content) > budget:
+                content = f"{content[:budget]}\n[... excerpt ends: workspace context budget reached]"
+            budget -= len(content)
+            structure.append(f"{subindent}Content of {relative_path}:")
+            structure.append(f"{subindent}{content}")
+
+        for path in list(self._dirs):
+            if path not in live_dirs:
+                del self._dirs[path]
+        for path in list(self._files):
+            if path not in live_files:
+                del self._files[path]
+        return "\n".join(structure)
+
+    def _read(self, path: str, mtime: int, size: int) -> str:
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == mtime and cached[1] == size:
+            return cached[2]
+
+        self.stats["file_reads"] += 1
+        try:
+            with open(path, "rb") as file:
+                head = file.read(self.max_file_bytes)
+            content = head.decode("utf-8", errors="replace")
+            if size > self.max_file_bytes:
+                content += (
+                    f"\n[... truncated: showing first {self.max_file_bytes} of {size} bytes. "
+                    "Use view_file_contents to read the rest]"
+                )
+        except OSError as e:
+            content = f"[Could not read file: {str(e)}]"
+        self._files[path] = (mtime, size, content)
+        return content
+
+
+def get_workspace_context(
+    root: str, extensions: Tuple[str, ...] = DEFAULT_EXTENSIONS
+) -> WorkspaceContext:
+    """Returns the shared context for a directory, so every agent on it reuses one cache."""
+    key = (os.path.abspath(root), tuple(extensions))
+    max_contexts = int(os.getenv("WORKSPACE_CONTEXT_MAX_DIRECTORIES", DEFAULT_MAX_CONTEXTS))
+    with _lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = WorkspaceContext.from_env(root, tuple(extensions))
+            _contexts[key] = context
+        _contexts.move_to_end(key)
+        while len(_contexts) > max(1, max_contexts):
+            _contexts.popitem(last=False)
+        return context
+
+
+def release_workspace_contexts(root: str):
+    """Drops the cached contexts of a directory that is no longer in use, e.g. a finished plan's."""
+    root = os.path.abspath(root)
+    with _lock:
+        for key in [key for key in _contexts if key[0] == root]:
+            del _contexts[key]
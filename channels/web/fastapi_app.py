@@ -11,6 +11,9 @@ from ARCANE.types import ChatMessage, create_chat_message
 from channels.web.web_communication_channel import WebCommunicationChannel
 from channels.web.web_socket_connection_manager import WebSocketConnectionManager
 from llm.LLM import LLM, ChatCompletion
+from ARCANE.planning.task_scheduler import get_task_agent_scheduler
+from ARCANE.planning.worker_pool import get_task_worker_pool_stats
+from ARCANE.planning.task_cache import get_task_cache
 import signal
 import asyncio
 import uuid
@@ -212,7 +215,9 @@ class FastApiApp:
                 
                 # If there were copied files, log them
                 if copied_files:
-                    await self.arcane_system.log_copied_files(sender, copied_files)
+                    await self.arcane_system.log_copied_files(
+                        sender, copied_files, data.get("thread_id")
+                    )
                 
                 return JSONResponse(content={"success": True, "sender": sender}, status_code=200)
             except Exception as e:
@@ -251,6 +256,17 @@ class FastApiApp:
                     status_code=400,
                 )
 
+        @app.get("/stats/task-agents/")
+        async def get_task_agent_stats():
+            stats = get_task_agent_scheduler().get_stats()
+            stats["worker_pool"] = get_task_worker_pool_stats()
+            return stats
+
+        @app.get("/stats/task-cache/")
+        async def get_task_cache_stats():
+            task_cache = get_task_cache()
+            return task_cache.get_stats() if task_cache else {"enabled": False}
+
         @app.get("/llmlog/")
         async def get_llm_completions():
             return self.llm.get_completion_log()
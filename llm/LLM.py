@@ -1,10 +1,19 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, TypedDict, Optional, Callable, Dict, Any
-from anthropic import Anthropic
+import copy
+import threading
+from typing import List, TypedDict, Optional, Callable, Dict, Any, Tuple, Union
 import os
 import json
-from util import load_actions, get_environment_variable
+from util import (
+    load_actions,
+    load_action_definitions,
+    get_action_set,
+    get_environment_variable,
+)
+from llm.client_pool import get_anthropic_client, get_request_semaphore
+from llm.response_cache import CHAT_LABEL, get_response_cache
+from llm.log_sink import get_log_sink
+from tracing import span
 import logging
 import time
 from datetime import datetime
@@ -12,6 +21,13 @@ import anthropic
 
 from anthropic.types import TextBlock, ToolUseBlock
 
+# Upper bound on in-flight completions per API key, overridable with LLM_MAX_CONCURRENCY
+DEFAULT_MAX_CONCURRENCY = 8
+
+# The Messages API accepts at most four cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+
 class LLMMessage(TypedDict):
     role: str
     content: str
@@ -22,46 +38,188 @@ class ChatCompletion(TypedDict):
     conversation: List[LLMMessage]
 
 
+class PromptSegment(TypedDict):
+    text: str
+    cacheable: bool
+
+
+def stable_segment(text: str) -> PromptSegment:
+    """A prompt segment that is byte-identical across calls and worth caching."""
+    return {"text": text, "cacheable": True}
+
+
+def volatile_segment(text: str) -> PromptSegment:
+    """A prompt segment that changes between calls (narrative, workspace, goal)."""
+    return {"text": text, "cacheable": False}
+
+
+def render_segments(segments: List[PromptSegment]) -> str:
+    return "\n".join(segment["text"] for segment in segments)
+
+
+SystemPrompt = Union[str, List[PromptSegment]]
+
+# Compiled tool configs per (action set, isolated_agent), rebuilt when
+# action_definitions.yaml changes
+_tool_config_lock = threading.Lock()
+_tool_config_cache: Dict[Any, Any] = {}
+
+
 class LLM:
-    def __init__(self, logging, api_key, model):
+    def __init__(self, logging, api_key, model, max_concurrency: Optional[int] = None):
         self.api_key = api_key
         self.model = model
-        self.client = Anthropic(api_key=self.api_key)
-        self.executor = ThreadPoolExecutor()
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+        )
         self.completion_log: List[ChatCompletion] = []
         self.listeners = set()
         self.logging = logging
         self.log_folder = "llm_logs"
-        os.makedirs(self.log_folder, exist_ok=True)
+        self.response_cache = get_response_cache()
+        self.prompt_cache_stats = {
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "input_tokens": 0,
+        }
+
+    # Looked up on each use, so an LLM keeps working after close_clients and close_log_sinks
+    @property
+    def client(self):
+        return get_anthropic_client(self.api_key)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        return get_request_semaphore(self.api_key, self.max_concurrency)
+
+    @property
+    def log_sink(self):
+        return get_log_sink(self.log_folder)
 
     def log_request_response(
         self, request: Dict[str, Any], response: Any, success: bool
     ):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        log_file = os.path.join(self.log_folder, f"{timestamp}_llm_log.json")
-        log_data = {
-            "timestamp": timestamp,
-            "request": request,
-            "response": response,
-            "success": success,
-        }
-        with open(log_file, "w") as f:
-            json.dump(log_data, f, indent=2)
+        # Serialization and disk writes happen on the sink's writer thread
+        self.log_sink.submit(
+            {
+                "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
+                "model": self.model,
+                "request": request,
+                "response": response,
+                "success": success,
+            }
+        )
+
+    async def _create_message(self, request: Dict[str, Any]):
+        # Awaits the async client so the event loop keeps serving websockets and
+        # other agents while the request is in flight.
+        tool_names = [tool["name"] for tool in request.get("tools", [])]
+        label = tool_names[0] if tool_names else CHAT_LABEL
+        with span(f"llm {label}", "llm", model=self.model) as trace_args:
+            queued_at = time.monotonic()
+            async with self.semaphore:
+                trace_args["queue_wait_ms"] = round(
+                    (time.monotonic() - queued_at) * 1000, 3
+                )
+                response = await self.client.messages.create(**request)
+            usage = response.usage
+            if usage is not None:
+                for field in (
+                    "input_tokens",
+                    "output_tokens",
+                    "cache_read_input_tokens",
+                    "cache_creation_input_tokens",
+                ):
+                    trace_args[field] = getattr(usage, field, None) or 0
+        self.report_prompt_cache_usage(label, response.usage)
+        return response
+
+    async def get_cached_response(
+        self, label: str, request: Dict[str, Any]
+    ) -> Tuple[Optional[str], Any]:
+        """
+        Returns (cache_key, cached_result) for a request. The key is None when
+        caching is off for this label, and the result is None on a miss.
+        """
+        if self.response_cache is None or not self.response_cache.is_enabled_for(
+            label
+        ):
+            return None, None
+        cache_key = self.response_cache.make_key(request)
+        cached = await self.response_cache.get(cache_key)
+        if cached is not None:
+            self.logging.debug(f"LLM response cache hit [{label}]")
+        return cache_key, cached
+
+    def report_prompt_cache_usage(self, label: str, usage: Any):
+        if usage is None:
+            return
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_created = getattr(usage, "cache_creation_input_tokens", None) or 0
+        uncached = getattr(usage, "input_tokens", None) or 0
+
+        self.prompt_cache_stats["cache_read_input_tokens"] += cache_read
+        self.prompt_cache_stats["cache_creation_input_tokens"] += cache_created
+        self.prompt_cache_stats["input_tokens"] += uncached
+
+        total = cache_read + cache_created + uncached
+        hit_rate = cache_read / total if total else 0.0
+        self.logging.info(
+            f"Prompt cache [{label}]: {cache_read} read, {cache_created} written, "
+            f"{uncached} uncached input tokens ({hit_rate:.0%} hit rate)"
+        )
+
+    @staticmethod
+    def build_system_blocks(segments: List[PromptSegment]) -> List[Dict[str, Any]]:
+        """
+        Converts prompt segments into Messages API system blocks, in the order given.
+        Cacheable segments get an ephemeral cache_control marker; only the last
+        MAX_CACHE_BREAKPOINTS of them are marked since the API rejects more.
+        """
+        blocks = []
+        cacheable = []
+        for segment in segments:
+            if not segment["text"].strip():
+                continue
+            block = {"type": "text", "text": segment["text"]}
+            blocks.append(block)
+            if segment["cacheable"]:
+                cacheable.append(block)
+        for block in cacheable[-MAX_CACHE_BREAKPOINTS:]:
+            block["cache_control"] = {"type": "ephemeral"}
+        return blocks
 
     async def create_chat_completion(
-        self, system_message: str, user_message: str, tool_config: Dict[str, Any] = None
+        self,
+        system_message: SystemPrompt,
+        user_message: str,
+        tool_config: Dict[str, Any] = None,
     ) -> Dict[str, Any]:
-        conversation = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message},
-        ]
+        system = None
+        if isinstance(system_message, list):
+            # Structured prompts go out as system blocks so the stable prefix can
+            # be served from the provider's prompt cache.
+            system = self.build_system_blocks(system_message)
+            conversation = [{"role": "user", "content": user_message or "Hello!"}]
+        else:
+            conversation = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message},
+            ]
         if tool_config:
-            return await self.create_conversation_completion(conversation, tool_config)
+            return await self.create_conversation_completion(
+                conversation, tool_config, system=system
+            )
         else:
-            return await self.create_standard_chat_completion(conversation)
+            return await self.create_standard_chat_completion(
+                conversation, system=system
+            )
 
     async def create_standard_chat_completion(
-        self, conversation: List[Dict[str, str]], max_tokens: int = 4000
+        self,
+        conversation: List[Dict[str, str]],
+        max_tokens: int = 4000,
+        system: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         messages = [
             {
@@ -79,12 +237,20 @@ class LLM:
             "messages": messages,
             "max_tokens": max_tokens,
         }
+        if system:
+            request["system"] = system
+
+        cache_key, cached = await self.get_cached_response(CHAT_LABEL, request)
+        if cached is not None:
+            return cached
 
         try:
-            response = self.client.messages.create(**request)
+            response = await self._create_message(request)
             content = response.content[0].text if response.content else ""
             
-            self.log_request_response(request, response.dict(), True)
+            self.log_request_response(request, response, True)
+            if cache_key and content:
+                await self.response_cache.set(CHAT_LABEL, cache_key, content)
             return content
 
         except Exception as e:
@@ -93,7 +259,10 @@ class LLM:
             return None
     
     async def create_conversation_completion(
-        self, conversation: List[Dict[str, str]], tool_config: Dict[str, Any]
+        self,
+        conversation: List[Dict[str, str]],
+        tool_config: Dict[str, Any],
+        system: Optional[List[Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
         messages = [
             {
@@ -114,8 +283,15 @@ class LLM:
             "max_tokens": 4000,
             "tools": [tool],
         }
+        if system:
+            request["system"] = system
+
+        cache_key, cached = await self.get_cached_response(tool_config["name"], request)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.messages.create(**request)
+            response = await self._create_message(request)
             action = None
             for content_item in response.content:
                 if tool_config['name'] == 'create_action':
@@ -152,7 +328,9 @@ class LLM:
                         
 
             success = action is not None
-            self.log_request_response(request, response.dict(), success)
+            self.log_request_response(request, response, success)
+            if cache_key and success:
+                await self.response_cache.set(tool_config["name"], cache_key, action)
             # if tool_config['name'] == "create_action":
             #     from remote_pdb import RemotePdb; RemotePdb('0.0.0.0', 5678).set_trace()
             
@@ -195,6 +373,24 @@ class LLM:
     def get_tool_config(
         tool_type: str, agent_type: str, isolated_agent: bool = False
     ) -> Dict[str, Any]:
+        mtime, _ = load_action_definitions()
+        action_set = get_action_set(agent_type)
+        with _tool_config_lock:
+            if _tool_config_cache.get("mtime") != mtime:
+                _tool_config_cache.clear()
+                _tool_config_cache["mtime"] = mtime
+            key = (action_set, isolated_agent)
+            tool_configs = _tool_config_cache.get(key)
+            if tool_configs is None:
+                tool_configs = LLM._build_tool_configs(agent_type, isolated_agent)
+                _tool_config_cache[key] = tool_configs
+        # Hand out a copy so callers can never mutate the compiled catalog
+        return copy.deepcopy(tool_configs.get(tool_type, {}))
+
+    @staticmethod
+    def _build_tool_configs(
+        agent_type: str, isolated_agent: bool
+    ) -> Dict[str, Dict[str, Any]]:
         actions = load_actions(agent_type)
         action_names = [action["name"] for action in actions]
 
@@ -283,6 +479,16 @@ class LLM:
                                                 "name": {"type": "string"},
                                                 "description": {"type": "string"},
                                                 "agent_type": {"type": "string"},
+                                                "input_files": {
+                                                    "type": "array",
+                                                    "items": {"type": "string"},
+                                                    "description": "Files the task reads, including outputs of earlier-level tasks",
+                                                },
+                                                "output_files": {
+                                                    "type": "array",
+                                                    "items": {"type": "string"},
+                                                    "description": "Files the task creates or modifies",
+                                                },
                                             },
                                             "required": [
                                                 "name",
@@ -300,4 +506,4 @@ class LLM:
                 },
             },
         }
-        return tool_configs.get(tool_type, {})
+        return tool_configs
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+# Keep-alive connection pool sizing shared by every client in the process
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+_lock = threading.Lock()
+_clients: Dict[str, AsyncAnthropic] = {}
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_llms: Dict[Tuple[str, str, Any], "LLM"] = {}
+
+
+def get_anthropic_client(api_key: str) -> AsyncAnthropic:
+    """
+    Returns the process-wide AsyncAnthropic client for an API key.
+    All models used with the same key share one keep-alive HTTP connection pool.
+    """
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=int(
+                    os.getenv("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)
+                ),
+                max_keepalive_connections=int(
+                    os.getenv(
+                        "LLM_MAX_KEEPALIVE_CONNECTIONS",
+                        DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                    )
+                ),
+                keepalive_expiry=float(
+                    os.getenv("LLM_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)
+                ),
+            )
+            client = AsyncAnthropic(
+                api_key=api_key, http_client=DefaultAsyncHttpxClient(limits=limits)
+            )
+            _clients[api_key] = client
+        return client
+
+
+def get_request_semaphore(api_key: str, max_concurrency: int) -> asyncio.Semaphore:
+    """
+    Returns the semaphore bounding in-flight completions for an API key, so the
+    concurrency limit holds across every LLM that borrows the same client.
+    """
+    with _lock:
+        semaphore = _semaphores.get(api_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            _semaphores[api_key] = semaphore
+        return semaphore
+
+
+def get_llm(logger, api_key: str, model: str) -> "LLM":
+    """
+    Returns the process-wide LLM for (model, api_key, logger), creating it on
+    first use. LLMs for the same key still share one client and semaphore.
+    """
+    from llm.LLM import LLM
+
+    key = (model, api_key, logger)
+    with _lock:
+        llm = _llms.get(key)
+    if llm is None:
+        llm = LLM(logger, api_key, model)
+        with _lock:
+            llm = _llms.setdefault(key, llm)
+    return llm
+
+
+async def close_clients():
+    """
+    Closes every client and empties the registries; LLMs still held elsewhere
+    pick up a fresh client on their next request.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _semaphores.clear()
+        _llms.clear()
+    for client in clients:
+        await client.close()
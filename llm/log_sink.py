@@ -0,0 +1,226 @@
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_SEGMENT_MAX_AGE = 3600.0
+DEFAULT_RETENTION_BYTES = 512 * 1024 * 1024
+DEFAULT_RETENTION_AGE = 7 * 24 * 3600.0
+
+# Records written per wake-up of the writer thread before it flushes
+WRITE_BATCH_SIZE = 256
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sinks: Dict[tuple, "LLMLogSink"] = {}
+
+
+def _to_jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict"):
+        return value.dict()
+    return str(value)
+
+
+class LLMLogSink:
+    """
+    Append-only JSONL sink for LLM request/response records.
+
+    Records go onto a bounded queue and a daemon thread writes them in batches to
+    rotating segment files, so a completion never waits on disk. When the queue
+    is full, or the sink is closed, the record is dropped and counted rather
+    than blocking the caller; drops after close are also logged.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+        segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        segment_max_age: float = DEFAULT_SEGMENT_MAX_AGE,
+        compress: bool = False,
+        retention_bytes: int = DEFAULT_RETENTION_BYTES,
+        retention_age: float = DEFAULT_RETENTION_AGE,
+    ):
+        self.folder = folder
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.compress = compress
+        self.retention_bytes = retention_bytes
+        self.retention_age = retention_age
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._segment_opened_at = 0.0
+        self._closed = False
+        os.makedirs(self.folder, exist_ok=True)
+
+        self._thread = threading.Thread(
+            target=self._run, name="llm-log-sink", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, folder: str) -> "LLMLogSink":
+        return cls(
+            folder,
+            max_queue=int(os.getenv("LLM_LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+            segment_max_bytes=int(
+                os.getenv("LLM_LOG_SEGMENT_MAX_BYTES", DEFAULT_SEGMENT_MAX_BYTES)
+            ),
+            segment_max_age=float(
+                os.getenv("LLM_LOG_SEGMENT_MAX_AGE", DEFAULT_SEGMENT_MAX_AGE)
+            ),
+            compress=os.getenv("LLM_LOG_COMPRESS", "false").lower() == "true",
+            retention_bytes=int(
+                os.getenv("LLM_LOG_RETENTION_BYTES", DEFAULT_RETENTION_BYTES)
+            ),
+            retention_age=float(
+                os.getenv("LLM_LOG_RETENTION_AGE", DEFAULT_RETENTION_AGE)
+            ),
+        )
+
+    def submit(self, record: Dict[str, Any]):
+        if self._closed:
+            self.dropped += 1
+            logger.warning(
+                f"LLM log sink for {self.folder} is closed; dropped record ({self.dropped} dropped so far)"
+            )
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Flushes queued records and closes the active segment."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is _STOP:
+                    stop = True
+                    continue
+                self._write(record)
+
+            if self._segment is not None:
+                self._segment.flush()
+            if stop:
+                self._close_segment()
+                return
+
+    def _write(self, record: Dict[str, Any]):
+        try:
+            line = json.dumps(record, default=_to_jsonable)
+        except (TypeError, ValueError) as e:
+            line = json.dumps({"timestamp": record.get("timestamp"), "error": str(e)})
+
+        if self._segment is None or self._should_rotate():
+            self._close_segment()
+            self._open_segment()
+        self._segment.write(line + "\n")
+        self.written += 1
+
+    def _should_rotate(self) -> bool:
+        if time.time() - self._segment_opened_at >= self.segment_max_age:
+            return True
+        return self._segment.tell() >= self.segment_max_bytes
+
+    def _open_segment(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self._segment_path = os.path.join(
+            self.folder, f"llm_log_{timestamp}_{os.getpid()}.jsonl"
+        )
+        self._segment = open(self._segment_path, "a")
+        self._segment_opened_at = time.time()
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._segment.close()
+        if self.compress:
+            with open(self._segment_path, "rb") as src, gzip.open(
+                f"{self._segment_path}.gz", "wb"
+            ) as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self._segment_path)
+        self._segment = None
+        self._segment_path = None
+        self._apply_retention()
+
+    def _apply_retention(self):
+        segments = []
+        for path in glob.glob(os.path.join(self.folder, "llm_log_*.jsonl*")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            segments.append((stat.st_mtime, stat.st_size, path))
+        segments.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in segments)
+        for mtime, size, path in segments:
+            if now - mtime <= self.retention_age and total <= self.retention_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def get_log_sink(folder: str) -> LLMLogSink:
+    """Returns the log sink for a folder in the current process."""
+    # Keyed by pid as well, since a forked child does not inherit the writer thread
+    key = (folder, os.getpid())
+    with _lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = LLMLogSink.from_env(folder)
+            _sinks[key] = sink
+        return sink
+
+
+def close_log_sinks():
+    """Closes this process's sinks; the next get_log_sink opens a new one."""
+    with _lock:
+        keys = [key for key in _sinks if key[1] == os.getpid()]
+        sinks = [_sinks.pop(key) for key in keys]
+    for sink in sinks:
+        sink.close()
@@ -0,0 +1,177 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+
+# Label used for completions made without a tool
+CHAT_LABEL = "chat"
+
+DEFAULT_CACHE_DIR = "llm_cache"
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600.0
+
+_lock = threading.Lock()
+_cache: Optional["ResponseCache"] = None
+_cache_loaded = False
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of LLM completion results.
+
+    Entries live in a bounded in-memory LRU backed by an SQLite file, so every
+    agent process started from the same working directory shares the disk tier.
+    Only labels (tool names, or "chat") that were opted in are cached.
+    """
+
+    def __init__(
+        self,
+        tool_ttls: Dict[str, float],
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.tool_ttls = tool_ttls
+        self.max_entries = max_entries
+        self.memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "responses.sqlite3")
+        with closing(self._connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, label TEXT, value TEXT, expires_at REAL)"
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """
+        Builds a cache from LLM_CACHE_TOOLS, a comma-separated list of labels with
+        optional TTLs in seconds, e.g. "set_goal:600,goal_check,chat:86400".
+        Returns None when the variable is unset, which disables caching.
+        """
+        spec = os.getenv("LLM_CACHE_TOOLS", "").strip()
+        if not spec:
+            return None
+
+        default_ttl = float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        tool_ttls = {}
+        for item in spec.split(","):
+            label, _, ttl = item.strip().partition(":")
+            if label:
+                tool_ttls[label] = float(ttl) if ttl else default_ttl
+
+        return cls(
+            tool_ttls,
+            cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        )
+
+    def is_enabled_for(self, label: str) -> bool:
+        return label in self.tool_ttls
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        keyed = {
+            field: request.get(field)
+            for field in ("model", "messages", "system", "tools", "max_tokens")
+        }
+        payload = json.dumps(keyed, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self.memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                # Callers may mutate returned actions, so never hand out the cached object
+                return copy.deepcopy(value)
+            del self.memory[key]
+
+        row = await asyncio.to_thread(self._disk_get, key)
+        if row is not None and row[0] > now:
+            value = json.loads(row[1])
+            self._remember(key, row[0], copy.deepcopy(value))
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, label: str, key: str, value: Any):
+        expires_at = time.time() + self.tool_ttls.get(label, DEFAULT_TTL_SECONDS)
+        self._remember(key, expires_at, copy.deepcopy(value))
+        self.stats["stores"] += 1
+        await asyncio.to_thread(
+            self._disk_set, key, label, json.dumps(value), expires_at
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        try:
+            with closing(self._connect()) as connection, connection:
+                return connection.execute(
+                    "SELECT expires_at, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _disk_set(self, key: str, label: str, value: str, expires_at: float):
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, label, value, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, label, value, expires_at),
+                )
+                connection.execute(
+                    "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+                )
+        except sqlite3.Error:
+            pass
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Returns the process-wide response cache, or None if caching is disabled."""
+    global _cache, _cache_loaded
+    with _lock:
+        if not _cache_loaded:
+            _cache = ResponseCache.from_env()
+            _cache_loaded = True
+        return _cache
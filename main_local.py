@@ -21,16 +21,21 @@ def clear_llm_logs():
 
 
 def run_server(agent_config, common_actions, llm_config, port, api_key, agent_factory):
-    from llm.LLM import LLM
+    from llm.client_pool import get_llm
     from channels.web.fastapi_app import FastApiApp
 
     logger = setup_logger(agent_config["name"])
-    llm = LLM(logger, **llm_config)
+    llm = get_llm(logger, **llm_config)
     agent = agent_factory.create_agent(
         agent_config, common_actions, llm, logger, api_key
     )
     app = FastApiApp(agent, llm, port)
-    asyncio.run(app.run())
+
+    async def serve():
+        await agent.start()
+        await app.run()
+
+    asyncio.run(serve())
 
 
 def main():
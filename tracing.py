@@ -0,0 +1,165 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def _now_us() -> float:
+    return time.time() * 1_000_000
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("PLAN_TRACING_ENABLED", "true").lower() == "true"
+
+
+class Trace:
+    """
+    Spans recorded during one plan execution, exported as Chrome trace-event
+    JSON (chrome://tracing, Perfetto). Every span lands on a lane; tasks get a
+    lane of their own so concurrent tasks show up as parallel tracks.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pid = os.getpid()
+        self.events: List[Dict[str, Any]] = []
+        self.lanes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lane(self, name: str) -> int:
+        with self._lock:
+            if name not in self.lanes:
+                self.lanes[name] = len(self.lanes)
+            return self.lanes[name]
+
+    def add_span(
+        self,
+        name: str,
+        category: str,
+        start_us: float,
+        end_us: float,
+        lane: int = 0,
+        args: Optional[Dict[str, Any]] = None,
+    ):
+        with self._lock:
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start_us,
+                    "dur": max(end_us - start_us, 0.0),
+                    "pid": self.pid,
+                    "tid": lane,
+                    "args": args or {},
+                }
+            )
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            metadata = [
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": 0,
+                    "args": {"name": self.name},
+                }
+            ] + [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": lane_name},
+                }
+                for lane_name, tid in self.lanes.items()
+            ]
+            events = sorted(self.events, key=lambda event: event["ts"])
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        os.replace(temp_path, path)
+
+
+@contextmanager
+def start_trace(name: str, lane_name: str = "plan"):
+    """Makes a new trace current for this context and the asyncio tasks it spawns."""
+    trace = Trace(name)
+    trace.lane(lane_name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def get_current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, category: str, lane_name: Optional[str] = None, **args):
+    """
+    Records a span on the current trace; a no-op when no trace is active.
+    The span inherits its parent's lane unless lane_name opens a new one.
+    Yields the span's args dict so callers can attach results such as token counts.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield args
+        return
+
+    parent = _current_span.get()
+    if lane_name is not None:
+        lane = trace.lane(lane_name)
+    else:
+        lane = parent["lane"] if parent else 0
+    current = {"lane": lane, "args": args}
+    token = _current_span.set(current)
+    start = _now_us()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span(name, category, start, _now_us(), lane, args)
+
+
+def record_span(
+    name: str,
+    category: str,
+    start_time: float,
+    end_time: float,
+    lane_name: Optional[str] = None,
+    **args,
+):
+    """Adds an already-measured span (time.time() seconds) to the current trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    if lane_name is not None:
+        lane = trace.lane(lane_name)
+    else:
+        parent = _current_span.get()
+        lane = parent["lane"] if parent else 0
+    trace.add_span(
+        name, category, start_time * 1_000_000, end_time * 1_000_000, lane, args
+    )
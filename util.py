@@ -1,11 +1,18 @@
+import copy
 import json
 import os
+import threading
 import yaml
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+ACTION_DEFINITIONS_PATH = "action_definitions.yaml"
+
+_action_definitions_lock = threading.Lock()
+_action_definitions = {}  # path -> (mtime, parsed definitions)
+
 
 def has_environment_variable(name):
     value = os.getenv(name)
@@ -29,14 +36,37 @@ def parse_json(input_string):
         return None
 
 
-def load_actions(agent_type):
-    with open("action_definitions.yaml", "r") as file:
-        all_actions = yaml.safe_load(file)
-    
-    agent_type = agent_type.split("-")[0]
+def load_action_definitions(path=ACTION_DEFINITIONS_PATH):
+    """
+    Returns (mtime, definitions) for the action definitions file. The YAML is
+    parsed once per process and only re-read when the file's mtime changes.
+    Callers must treat the returned definitions as read-only.
+    """
+    mtime = os.path.getmtime(path)
+    with _action_definitions_lock:
+        cached = _action_definitions.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, "r") as file:
+                cached = (mtime, yaml.safe_load(file))
+            _action_definitions[path] = cached
+        return cached
+
 
-    actions = all_actions["common_actions"]
+def get_action_set(agent_type):
+    """Maps an agent type or id (e.g. "iris-5000") to its action set name."""
+    _, all_actions = load_action_definitions()
+    agent_type = agent_type.split("-")[0]
     if agent_type in all_actions["agent_specific_actions"]:
-        actions.extend(all_actions["agent_specific_actions"][agent_type])
+        return agent_type
+    return "common"
+
+
+def load_actions(agent_type):
+    _, all_actions = load_action_definitions()
+    action_set = get_action_set(agent_type)
+
+    actions = list(all_actions["common_actions"])
+    if action_set != "common":
+        actions += all_actions["agent_specific_actions"][action_set]
 
-    return actions
+    return copy.deepcopy(actions)